@@ -0,0 +1,62 @@
+# bench/blocklist.py - compiled blocklist vs. the old linear substring scan
+#
+# Run from the repo root:  python -m bench.blocklist
+
+import random
+import string
+import time
+from blocklist import Blocklist
+
+def legacy_is_blocked(text, url, domains, keywords):
+    text_lower = text.lower()
+    if any(domain in url for domain in domains if domain):
+        return True
+    if any(keyword in text_lower for keyword in keywords if keyword):
+        return True
+    return False
+
+def _word(rng, n=7):
+    return "".join(rng.choices(string.ascii_lowercase, k=n))
+
+def make_rules(rng, n):
+    domains = [f"{_word(rng)}.{rng.choice(['com', 'net', 'org', 'com.au'])}" for _ in range(n)]
+    keywords = [f"{_word(rng)} {_word(rng, 5)}" for _ in range(n)]
+    return domains, keywords
+
+def make_candidates(rng, n, domains, keywords):
+    out = []
+    for i in range(n):
+        title = " ".join(_word(rng, rng.randint(3, 9)) for _ in range(12))
+        host = f"news{i % 50}.{_word(rng)}.com"
+        if i % 20 == 0:
+            host = "www." + rng.choice(domains)
+        if i % 33 == 0:
+            title += " " + rng.choice(keywords)
+        out.append((title, f"https://{host}/story/{i}?ref=feed"))
+    return out
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+def main():
+    rng = random.Random(42)
+    candidates_n = 5000
+    print(f"{'rules':>7} {'legacy (s)':>11} {'build (s)':>10} {'compiled (s)':>13} {'speedup':>8}")
+    for rules_n in (100, 1000, 5000, 20000):
+        domains, keywords = make_rules(rng, rules_n)
+        candidates = make_candidates(rng, candidates_n, domains, keywords)
+        legacy_t, legacy_hits = timed(lambda: sum(legacy_is_blocked(t, u, domains, keywords) for t, u in candidates))
+        build_t, bl = timed(lambda: Blocklist(domains, keywords))
+        fast_t, fast_hits = timed(lambda: sum(bl.is_blocked(t, u) for t, u in candidates))
+        print(f"{rules_n:>7} {legacy_t:>11.3f} {build_t:>10.3f} {fast_t:>13.3f} {legacy_t / fast_t:>7.0f}x"
+              f"   ({legacy_hits} vs {fast_hits} blocked of {candidates_n})")
+
+    # The substring scan also blocks unrelated hosts
+    bl = Blocklist(["ad.com"], ["cure"])
+    url = "https://bad.com.au/article"
+    print(f"\n'ad.com' vs {url}: legacy={legacy_is_blocked('', url, ['ad.com'], [])} compiled={bl.is_blocked('', url)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# bench/e2e.py - whole-pipeline benchmark against local fake upstreams (see bench/fakes.py)
+#
+# Run from the repo root:  python -m bench.e2e [--runs 20] [--channels 4] [--latency 0.05]
+#
+# Everything (fetch, filter, image download + variants, upload, history, queue) runs for real;
+# only the network ends at 127.0.0.1. Twitter is left out because tweepy's hosts are fixed.
+# Reports run_once latency (p50/p95/max), multi-channel throughput and peak memory.
+
+import argparse
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from bench.fakes import FakeUpstreams, Route, ROUTES
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__)
+    p.add_argument("--runs", type=int, default=20, help="sequential run_once calls to time")
+    p.add_argument("--channels", type=int, default=4, help="channels published concurrently for throughput")
+    p.add_argument("--latency", type=float, default=0.02, help="seconds added to every upstream response")
+    p.add_argument("--error-rate", type=float, default=0.0, help="share of upstream responses that are 503s")
+    p.add_argument("--image-kb", type=int, default=300, help="size of the served source images")
+    p.add_argument("--articles", type=int, default=20, help="articles/posts per listing")
+    return p.parse_args(argv)
+
+def pct(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def configure(fake: FakeUpstreams):
+    # Must happen before bot (and the modules it imports) read their settings
+    os.environ.update(fake.env())
+    os.environ.update({
+        "DRY_RUN": "false",
+        "PUBLISH_PLATFORMS": "instagram,facebook,bluesky",
+        "NEWS_CACHE_TTL": "0",
+        "QUEUE_TARGET": "0",
+        "METRICS_DIR": "metrics",
+        "CIRCUIT_BREAKER_THRESHOLD": "1000000",
+    })
+    for name in ROUTES + ("twitter", "instagram", "facebook", "bluesky"):
+        os.environ[f"RATE_LIMIT_{name.upper()}"] = "1000000"
+    os.environ["RATE_LIMIT_FEED:127.0.0.1"] = "1000000"  # feeds are limited per host (see feeds.py)
+
+def main(argv=None):
+    args = parse_args(argv)
+    route = lambda: Route(latency=args.latency, error_rate=args.error_rate, items=args.articles)
+    fake = FakeUpstreams(image_kb=args.image_kb, routes={name: route() for name in ROUTES}).start()
+    workdir = tempfile.mkdtemp(prefix="curator-bench-")
+    os.chdir(workdir)
+    configure(fake)
+
+    from bot import run_once
+    from channels import Channel, run_in_channel
+
+    print(f"[Bench] upstreams at {fake.url}, working dir {workdir}")
+    print(f"[Bench] latency={args.latency}s error_rate={args.error_rate} image={len(fake.image) // 1024}KB "
+          f"listing={args.articles}")
+
+    # The first run also imports the platform/source libraries and logs in; time it separately
+    start = time.perf_counter()
+    run_once()
+    first = time.perf_counter() - start
+
+    tracemalloc.start()
+    latencies, posted = [], 0
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        results = run_once() or []
+        latencies.append(time.perf_counter() - start)
+        posted += sum(1 for r in results if r.success)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"\nfirst run_once (lazy imports, logins): {first:.3f}s")
+    print(f"run_once x{args.runs}: p50={pct(latencies, .5):.3f}s p95={pct(latencies, .95):.3f}s "
+          f"max={max(latencies):.3f}s mean={statistics.mean(latencies):.3f}s")
+    print(f"  platform posts succeeded: {posted}/{args.runs * 3}")
+    print(f"  tracemalloc peak: {peak / 2**20:.1f} MiB")
+
+    channels = [Channel(name=f"bench{i}", env=fake.env(), data_dir=os.path.join("channels", f"bench{i}"))
+                for i in range(args.channels)]
+    per_channel = max(1, args.runs // args.channels)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.channels) as pool:
+        jobs = [pool.submit(run_in_channel, c, run_once) for c in channels for _ in range(per_channel)]
+        for job in jobs:
+            job.result()
+    elapsed = time.perf_counter() - start
+    print(f"\n{args.channels} channels x{per_channel} runs: {len(jobs) / elapsed:.2f} runs/s ({elapsed:.2f}s)")
+
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2**20 if sys.platform == "darwin" else 2**10)
+    print(f"max RSS: {rss:.1f} MiB")
+    print("requests per upstream: " + ", ".join(f"{k}={v}" for k, v in fake.counts.items()))
+    fake.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# bench/fakes.py - local stand-ins for every upstream the bot talks to
+#
+# One threaded HTTP server answers NewsAPI, Reddit (OAuth token + listings), RSS feeds, Unsplash, image
+# downloads, the Graph API (Instagram /media + /media_publish, Facebook /photos) and an atproto
+# PDS (createSession, getProfile, uploadBlob, createRecord). Each route can be given extra
+# latency, an error rate and a payload size, so runs can be measured offline and for free.
+
+import base64
+import io
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+from PIL import Image
+
+@dataclass
+class Route:
+    latency: float = 0.0  # seconds added to every response
+    error_rate: float = 0.0  # share of requests answered with a 503
+    items: int = 20  # listing size (articles / posts)
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # clients hanging up early (size caps, deadlines) are expected
+
+IMAGE_VARIANTS = 64  # distinct images served, picked by URL
+
+ROUTES = ("newsapi", "reddit", "feeds", "unsplash", "image", "graph", "bluesky")
+FEED_EVERY = 5  # seconds between new entries in a fake feed
+
+def _jwt(exp: int) -> str:
+    def part(obj):
+        return base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    return f"{part({'alg': 'none', 'typ': 'JWT'})}.{part({'sub': 'did:plc:bench', 'exp': exp, 'iat': int(time.time()), 'scope': 'com.atproto.access'})}.sig"
+
+def make_jpeg(kb: int, size=(1600, 900), variant: int = 0) -> bytes:
+    # Noise compresses badly, so quality is stepped until the file is roughly `kb` kilobytes.
+    # Each variant is coarse enough to get its own perceptual hash (image_store rejects repeats).
+    rng = np.random.default_rng(kb)
+    pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    blocks = np.random.default_rng(variant).integers(0, 256, (8, 9, 1), dtype=np.uint8)
+    tint = np.kron(blocks, np.ones((size[1] // 8 + 1, size[0] // 9 + 1, 1), dtype=np.uint8))[:size[1], :size[0]]
+    img = Image.fromarray(pixels // 2 + tint // 2)
+    best = b""
+    for quality in (95, 85, 75, 60, 45, 30, 15, 5):
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=quality)
+        best = buf.getvalue()
+        if len(best) <= kb * 1024:
+            break
+    return best
+
+class FakeUpstreams:
+    def __init__(self, image_kb: int = 300, routes: dict | None = None, port: int = 0):
+        self.routes = {name: Route() for name in ROUTES}
+        for name, route in (routes or {}).items():
+            self.routes[name] = route
+        self.image_kb = image_kb
+        self.image = make_jpeg(image_kb)
+        self._images = {0: self.image}
+        self.counts = {name: 0 for name in ROUTES}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = _Server(("127.0.0.1", port), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def env(self) -> dict:
+        """Environment that points the bot at this server."""
+        return {
+            "NEWSAPI_KEY": "bench", "NEWSAPI_ENDPOINT": f"{self.url}/v2/everything",
+            "REDDIT_CLIENT_ID": "bench", "REDDIT_CLIENT_SECRET": "bench",
+            "REDDIT_URL": self.url, "REDDIT_OAUTH_URL": self.url,
+            "FEED_URLS": f"{self.url}/feeds/journal.rss",
+            "UNSPLASH_ACCESS_KEY": "bench", "UNSPLASH_ENDPOINT": f"{self.url}/photos/random",
+            "GRAPH_API_BASE": self.url,
+            "INSTAGRAM_ACCESS_TOKEN": "bench", "INSTAGRAM_ACCOUNT_ID": "17841400000000000",
+            "FACEBOOK_PAGE_ACCESS_TOKEN": "bench", "FACEBOOK_PAGE_ID": "100000000000000",
+            "BLUESKY_BASE_URL": f"{self.url}/xrpc", "BLUESKY_HANDLE": "bench.test", "BLUESKY_PASSWORD": "bench",
+        }
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name="fake-upstreams", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def next_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    # --- payloads ---
+
+    def image_for(self, path: str, width: int | None = None) -> bytes:
+        # ?w=<px> serves a downscaled copy, like Reddit's preview resolutions
+        variant = zlib.crc32(path.encode()) % IMAGE_VARIANTS
+        if variant not in self._images:
+            image = make_jpeg(self.image_kb, variant=variant)
+            with self._lock:
+                self._images.setdefault(variant, image)
+        if not width:
+            return self._images[variant]
+        key = (variant, width)
+        if key not in self._images:
+            img = Image.open(io.BytesIO(self._images[variant]))
+            img = img.resize((width, round(img.height * width / img.width)))
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=85)
+            with self._lock:
+                self._images.setdefault(key, buf.getvalue())
+        return self._images[key]
+
+    def news(self):
+        n = self.routes["newsapi"].items
+        articles = []
+        for _ in range(n):
+            i = self.next_id()
+            articles.append({
+                "source": {"id": None, "name": f"Bench Journal {i % 7}"},
+                "title": f"Study {i} links sleep pattern {i * 7919 % 1000} to healthy aging in cohort {i}",
+                "description": "A benchmark article.",
+                "url": f"https://news.bench.test/articles/{i}",
+                "urlToImage": f"{self.url}/images/{i}.jpg",
+                "publishedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            })
+        return {"status": "ok", "totalResults": n, "articles": articles}
+
+    def reddit_listing(self, subs):
+        children = []
+        for _ in range(self.routes["reddit"].items):
+            i = self.next_id()
+            sub = subs[i % len(subs)]
+            img = f"{self.url}/images/r{i}.jpg"
+            children.append({"kind": "t3", "data": {
+                "id": f"b{i}", "name": f"t3_b{i}", "title": f"Redditors report result {i} from habit {i * 104729 % 1000}",
+                "url": f"https://www.reddit.com/r/{sub}/comments/b{i}/", "score": (i * 37) % 5000,
+                "subreddit": sub, "created_utc": time.time() - i, "author": "bench", "permalink": f"/r/{sub}/comments/b{i}/",
+                "preview": {"images": [{"source": {"url": img, "width": 1600, "height": 900},
+                                        "resolutions": [{"url": img + "?w=320", "width": 320, "height": 180},
+                                                        {"url": img + "?w=640", "width": 640, "height": 360}]}]},
+            }})
+        return {"kind": "Listing", "data": {"after": None, "before": None, "children": children}}
+
+    def reddit_info(self, names):
+        # Current state of posts the bot already has: same posts, a few more votes
+        children = []
+        for name in filter(None, names):
+            i = int(name.removeprefix("t3_b"))
+            children.append({"kind": "t3", "data": {
+                "id": f"b{i}", "name": name, "title": f"Redditors report result {i} from habit {i * 104729 % 1000}",
+                "url": f"https://www.reddit.com/r/bench/comments/b{i}/", "score": (i * 37) % 5000 + 10,
+                "subreddit": "bench", "created_utc": time.time() - i, "removed_by_category": None,
+            }})
+        return {"kind": "Listing", "data": {"after": None, "before": None, "children": children}}
+
+    def feed(self, name: str) -> tuple[str, bytes]:
+        # (ETag, RSS 2.0 body); a new entry appears every FEED_EVERY seconds, so quick re-fetches get a 304
+        newest = int(time.time() // FEED_EVERY)
+        items = []
+        for i in range(newest, newest - self.routes["feeds"].items, -1):
+            items.append(
+                f"<item><title>Trial {i} finds exercise habit {i * 7919 % 1000} slows aging</title>"
+                f"<link>https://journal.bench.test/{name}/{i}</link><guid>{name}-{i}</guid>"
+                f"<description>&lt;p&gt;A benchmark abstract.&lt;/p&gt;</description>"
+                f"<pubDate>{time.strftime('%a, %d %b %Y %H:%M:%S +0000', time.gmtime(i * FEED_EVERY))}</pubDate>"
+                f"<media:content url=\"{self.url}/images/f{i}.jpg\" medium=\"image\"/></item>"
+            )
+        body = (f'<?xml version="1.0"?><rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">'
+                f"<channel><title>Bench Journal</title>{''.join(items)}</channel></rss>")
+        return f'"{newest}"', body.encode()
+
+    # --- server ---
+
+    def _route_for(self, path: str) -> str:
+        if path.startswith("/v2/everything"):
+            return "newsapi"
+        if path.startswith("/api/v1/access_token") or path.startswith("/r/") or path.startswith("/api/info"):
+            return "reddit"
+        if path.startswith("/feeds/"):
+            return "feeds"
+        if path.startswith("/photos/random"):
+            return "unsplash"
+        if path.startswith("/images/"):
+            return "image"
+        if path.startswith("/xrpc/"):
+            return "bluesky"
+        return "graph"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type="application/json", head=False, headers=None):
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if not head:
+                    self.wfile.write(body)
+
+            def _drain(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _handle(self, method):
+                parts = urlsplit(self.path)
+                path, query = parts.path, parse_qs(parts.query)
+                body = self._drain() if method == "POST" else b""
+                name = fake._route_for(path)
+                route = fake.routes[name]
+                with fake._lock:
+                    fake.counts[name] += 1
+                if route.latency:
+                    time.sleep(route.latency)
+                if route.error_rate and random.random() < route.error_rate:
+                    return self._send(503, {"error": "injected failure"})
+
+                if name == "newsapi":
+                    return self._send(200, fake.news())
+                if name == "reddit":
+                    if path.startswith("/api/v1/access_token"):
+                        return self._send(200, {"access_token": "bench", "token_type": "bearer",
+                                                "expires_in": 3600, "scope": "*"})
+                    if path.startswith("/api/info"):
+                        return self._send(200, fake.reddit_info(query.get("id", [""])[0].split(",")))
+                    subs = path.split("/")[2].split("+") if path.startswith("/r/") else ["bench"]
+                    return self._send(200, fake.reddit_listing(subs))
+                if name == "feeds":
+                    etag, body = fake.feed(path.rsplit("/", 1)[-1].split(".")[0])
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._send(304, b"", headers={"ETag": etag})
+                    return self._send(200, body, "application/rss+xml", headers={"ETag": etag})
+                if name == "unsplash":
+                    return self._send(200, {"id": str(fake.next_id()), "urls": {"regular": f"{fake.url}/images/unsplash.jpg"}})
+                if name == "image":
+                    image = fake.image_for(path, int(query["w"][0]) if "w" in query else None)
+                    match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                    if match:
+                        first = int(match[1])
+                        last = min(int(match[2] or len(image) - 1), len(image) - 1)
+                        return self._send(206, image[first:last + 1], "image/jpeg", head=method == "HEAD",
+                                          headers={"Content-Range": f"bytes {first}-{last}/{len(image)}"})
+                    return self._send(200, image, "image/jpeg", head=method == "HEAD")
+                if name == "bluesky":
+                    return self._xrpc(path.rsplit("/", 1)[-1], body)
+                # Graph API
+                if path.endswith("/media"):
+                    return self._send(200, {"id": str(fake.next_id())})
+                if path.endswith("/media_publish"):
+                    return self._send(200, {"id": str(fake.next_id())})
+                if path.endswith("/photos"):
+                    i = fake.next_id()
+                    return self._send(200, {"id": str(i), "post_id": f"100000000000000_{i}"})
+                return self._send(404, {"error": {"message": f"unknown path {path}"}})
+
+            def _xrpc(self, method, body):
+                if method in ("com.atproto.server.createSession", "com.atproto.server.refreshSession"):
+                    exp = int(time.time()) + 3600
+                    return self._send(200, {"did": "did:plc:bench", "handle": "bench.test",
+                                            "accessJwt": _jwt(exp), "refreshJwt": _jwt(exp + 86400)})
+                if method == "com.atproto.server.getSession":
+                    return self._send(200, {"did": "did:plc:bench", "handle": "bench.test"})
+                if method == "app.bsky.actor.getProfile":
+                    return self._send(200, {"did": "did:plc:bench", "handle": "bench.test"})
+                if method == "com.atproto.repo.uploadBlob":
+                    return self._send(200, {"blob": {"$type": "blob", "ref": {"$link": "bafkreibenchbenchbenchbenchbenchbenchbenchbenchbenchbench"},
+                                                     "mimeType": "image/jpeg", "size": len(body)}})
+                if method == "com.atproto.repo.createRecord":
+                    i = fake.next_id()
+                    return self._send(200, {"uri": f"at://did:plc:bench/app.bsky.feed.post/{i}", "cid": f"bafyrei{i:032d}"})
+                return self._send(400, {"error": "MethodNotImplemented", "message": method})
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_HEAD(self):
+                self._handle("HEAD")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
@@ -0,0 +1,76 @@
+# bench/fallback.py - cached CardRenderer vs. the original uncached card rendering
+#
+# Run from the repo root:  python -m bench.fallback
+
+import random
+import string
+import time
+from PIL import Image, ImageDraw, ImageFont
+from imaging import CardRenderer
+
+def legacy_render(text, size=(1200,675)):
+    # The pre-CardRenderer implementation, minus the final JPEG save
+    img = Image.new("RGB", size, color=(240,247,245))
+    draw = ImageDraw.Draw(img)
+    try:
+        font = ImageFont.load_default()
+    except Exception:
+        font = None
+    margin = 60
+    max_width = size[0] - 2*margin
+
+    wrapped = []
+    line = ""
+    for word in text.split():
+        test = (line + " " + word).strip()
+        bbox = draw.textbbox((0,0), test, font=font)
+        w = bbox[2] - bbox[0]
+        if w <= max_width:
+            line = test
+        else:
+            if line:
+                wrapped.append(line)
+            line = word
+    if line:
+        wrapped.append(line)
+
+    y = size[1]//3
+    for ln in wrapped:
+        bbox = draw.textbbox((0,0), ln, font=font)
+        w = bbox[2] - bbox[0]
+        h = bbox[3] - bbox[1]
+        x = (size[0]-w)//2
+        draw.text((x,y), ln, fill=(30,45,40), font=font)
+        y += h + 10
+
+    footer = "Health & Longevity Daily"
+    bbox = draw.textbbox((0,0), footer, font=font)
+    fw = bbox[2] - bbox[0]
+    fh = bbox[3] - bbox[1]
+    draw.text((size[0]-fw-16, size[1]-fh-12), footer, fill=(80,100,95), font=font)
+    return img
+
+def make_titles(rng, n, words):
+    return [" ".join("".join(rng.choices(string.ascii_letters, k=rng.randint(3, 10))) for _ in range(words))
+            for _ in range(n)]
+
+def main():
+    rng = random.Random(7)
+    cards = 100
+    print(f"{'words/title':>11} {'legacy (ms/card)':>17} {'renderer (ms/card)':>19} {'speedup':>8}")
+    for words in (12, 40, 150):
+        titles = make_titles(rng, cards, words)
+        start = time.perf_counter()
+        for t in titles:
+            legacy_render(t)
+        legacy = (time.perf_counter() - start) / cards * 1000
+
+        start = time.perf_counter()
+        renderer = CardRenderer()  # construction counted: one per batch
+        for t in titles:
+            renderer.render(t)
+        fast = (time.perf_counter() - start) / cards * 1000
+        print(f"{words:>11} {legacy:>17.2f} {fast:>19.2f} {legacy / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# bench/imports.py - cold-start import time of the one-shot entry points
+#
+# Run from the repo root:  python -m bench.imports [--runs 5]
+#
+# Each sample is a fresh interpreter, so nothing is cached in sys.modules; the -X importtime
+# breakdown of the last run shows which modules still dominate.
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ("bot", "main")
+HEAVY = ("tweepy", "atproto", "praw", "aiohttp", "PIL", "apscheduler")
+
+def cold_import(module: str) -> tuple[float, str]:
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          capture_output=True, text=True, env={**os.environ, "DRY_RUN": "true"})
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    return elapsed, proc.stderr
+
+def breakdown(importtime: str) -> dict[str, int]:
+    # "import time: self [us] | cumulative | imported package" -> cumulative us per top-level package
+    totals = {}
+    for line in importtime.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if "." not in name:
+            totals[name] = max(totals.get(name, 0), int(parts[1]))
+    return totals
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Cold-start import time of bot / main")
+    p.add_argument("--runs", type=int, default=5)
+    args = p.parse_args(argv)
+    baseline = statistics.median(cold_import("sys")[0] for _ in range(args.runs))
+    print(f"{'module':>8} {'median (s)':>11} {'min (s)':>8} {'minus bare interpreter':>23}")
+    for module in MODULES:
+        samples, last = [], ""
+        for _ in range(args.runs):
+            elapsed, last = cold_import(module)
+            samples.append(elapsed)
+        median = statistics.median(samples)
+        print(f"{module:>8} {median:>11.3f} {min(samples):>8.3f} {median - baseline:>23.3f}")
+        totals = breakdown(last)
+        loaded = [name for name in HEAVY if name in totals]
+        print(f"{'':>8} heavy packages loaded: {', '.join(loaded) or 'none'}")
+        for name, us in sorted(totals.items(), key=lambda kv: -kv[1])[:6]:
+            print(f"{'':>10} {name:<20} {us / 1e6:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# blocklist.py - compiled domain/keyword filter, built once and reloadable from a file
+#
+# BLOCKLIST_FILE format, one rule per line ('#' starts a comment):
+#   domain:spammyhealth.com
+#   keyword:miracle cure
+
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+BLOCKLIST_FILE = os.getenv("BLOCKLIST_FILE")
+
+_END = object()  # marks a complete rule inside a trie
+_TOKEN = re.compile(r"\w+")
+
+def _split_env(name: str) -> list[str]:
+    return [x.strip() for x in os.getenv(name, "").split(",") if x.strip()]
+
+def _clean_domain(domain: str) -> str:
+    domain = domain.strip().lower()
+    if "://" in domain:
+        domain = urlsplit(domain).hostname or ""
+    return domain.lstrip("*").strip(".")
+
+def read_rules(path: str) -> tuple[list[str], list[str]]:
+    domains, keywords = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            kind, _, value = line.partition(":")
+            if kind.strip() == "domain" and value.strip():
+                domains.append(value)
+            elif kind.strip() == "keyword" and value.strip():
+                keywords.append(value)
+    return domains, keywords
+
+class Blocklist:
+    def __init__(self, domains=(), keywords=()):
+        # Reversed-label trie: "ads.example.com" -> com -> example -> ads
+        self._trie = {}
+        self.domain_count = 0
+        for domain in {_clean_domain(d) for d in domains}:
+            if not domain:
+                continue
+            node = self._trie
+            for label in reversed(domain.split(".")):
+                node = node.setdefault(label, {})
+            node[_END] = True
+            self.domain_count += 1
+
+        # Keyword phrases go into a word-level trie, so matching costs one walk per word of the
+        # title no matter how many rules there are, and "ad" never matches inside "bad"
+        self._phrases = {}
+        self.keyword_count = 0
+        for phrase in {tuple(_TOKEN.findall(k.lower())) for k in keywords}:
+            if not phrase:
+                continue
+            node = self._phrases
+            for word in phrase:
+                node = node.setdefault(word, {})
+            node[_END] = True
+            self.keyword_count += 1
+
+    def domain_blocked(self, url: str) -> bool:
+        try:
+            host = (urlsplit(url).hostname or "").lower().rstrip(".")
+        except ValueError:
+            return False
+        node = self._trie
+        for label in reversed(host.split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+    def keyword_blocked(self, text: str) -> bool:
+        if not self._phrases:
+            return False
+        words = _TOKEN.findall(text.lower())
+        for i in range(len(words)):
+            node = self._phrases
+            for word in words[i:]:
+                node = node.get(word)
+                if node is None:
+                    break
+                if _END in node:
+                    return True
+        return False
+
+    def is_blocked(self, text: str, url: str) -> bool:
+        return self.domain_blocked(url or "") or self.keyword_blocked(text or "")
+
+def load_blocklist(path: str | None = BLOCKLIST_FILE) -> Blocklist:
+    domains, keywords = _split_env("BLOCKLIST_DOMAINS"), _split_env("BLOCKLIST_KEYWORDS")
+    if path and os.path.exists(path):
+        file_domains, file_keywords = read_rules(path)
+        domains += file_domains
+        keywords += file_keywords
+    return Blocklist(domains, keywords)
+
+_lock = threading.Lock()
+_current = None
+_mtime = None
+
+def get_blocklist() -> Blocklist:
+    # Built on first use; rebuilt only when BLOCKLIST_FILE changes on disk
+    global _current, _mtime
+    with _lock:
+        mtime = os.path.getmtime(BLOCKLIST_FILE) if BLOCKLIST_FILE and os.path.exists(BLOCKLIST_FILE) else None
+        if _current is None or mtime != _mtime:
+            _current = load_blocklist()
+            _mtime = mtime
+        return _current
@@ -7,32 +7,25 @@ import traceback
 import logging
 import re
 from urllib.parse import urlparse
+from hashlib import sha256
 from datetime import datetime
-from sources import fetch_news_article, fetch_reddit_post
-from imaging import download_image_to_path, get_first_valid_image_url_or_none, generate_fallback_image
-from posting import post_to_twitter, post_to_instagram, post_to_facebook, post_to_bluesky
-from posting import post_to_twitter, post_to_instagram, post_to_facebook, post_to_bluesky
+from sources import fetch_candidates
+from imaging import (download_image, get_first_valid_image_url_or_none, render_fallback_image, build_variants,
+                     cached_variants, dhash, resolve_image, ImageCandidate)
+from publishing import publish_all, enabled_platforms
+from history import get_history
+from image_store import get_image_store
+from ranking import get_ranker
+from blocklist import get_blocklist
+from content_queue import get_queue, MAX_PUBLISH_ATTEMPTS
+from channels import current_channel
+from clients import redact
+import metrics
+import profiling  # registers the PROFILE=cpu|memory|all span hook
 
-POST_MODE = os.getenv("POST_MODE", "auto").lower()  # auto/news/reddit
-HASHTAGS = "#Longevity #Health #Wellness #Biohacking"
 DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
-BLOCKLIST_DOMAINS = set(os.getenv("BLOCKLIST_DOMAINS", "").split(","))
-BLOCKLIST_KEYWORDS = set(os.getenv("BLOCKLIST_KEYWORDS", "").lower().split(","))
-
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
-BLOCKLIST_DOMAINS = set(os.getenv("BLOCKLIST_DOMAINS", "").split(","))
-BLOCKLIST_KEYWORDS = set(os.getenv("BLOCKLIST_KEYWORDS", "").lower().split(","))
+QUEUE_TARGET = int(os.getenv("QUEUE_TARGET", "3"))  # posts kept ready ahead of time
+QUEUE_MAX_AGE = float(os.getenv("QUEUE_MAX_AGE_HOURS", "72")) * 3600  # older queued posts are dropped
 
 # Set up logging
 logging.basicConfig(
@@ -56,20 +49,7 @@ def trim_caption_for_twitter(text: str, url: str = "") -> str:
     return f"{text} {url}".strip()
 
 def is_blocked(text: str, url: str) -> bool:
-    text_lower = text.lower()
-    if any(domain in url for domain in BLOCKLIST_DOMAINS if domain):
-        return True
-    if any(keyword in text_lower for keyword in BLOCKLIST_KEYWORDS if keyword):
-        return True
-    return False
-
-def is_blocked(text: str, url: str) -> bool:
-    text_lower = text.lower()
-    if any(domain in url for domain in BLOCKLIST_DOMAINS if domain):
-        return True
-    if any(keyword in text_lower for keyword in BLOCKLIST_KEYWORDS if keyword):
-        return True
-    return False
+    return get_blocklist().is_blocked(text, url)
 
 def build_caption_from_news(article: dict) -> str:
     title = article.get("title") or "Interesting health article"
@@ -77,142 +57,283 @@ def build_caption_from_news(article: dict) -> str:
     base = f"📰 {title}"
     if source:
         base += f" — {source}"
-    base += f"\n{HASHTAGS}"
+    base += f"\n{current_channel().hashtags}"
     return trim_caption_for_twitter(base, article.get("url", ""))
 
 def build_caption_from_reddit(post: dict) -> str:
     title = post.get("title") or "Trending on Reddit"
-    base = f"🔥 {title}\n{HASHTAGS}"
+    base = f"🔥 {title}\n{current_channel().hashtags}"
     return trim_caption_for_twitter(base, post.get("url", ""))
 
+def _build_item(candidate: dict) -> dict:
+    if candidate["type"] == "news":
+        return {
+            "type": "news",
+            "caption": build_caption_from_news(candidate["item"]),
+            "image_url": get_first_valid_image_url_or_none(candidate.get("image_url")),
+            "images": candidate.get("images") or [],
+            "fallback_query": "health longevity wellness",
+            "url": candidate.get("url"),
+            "title": candidate.get("title", ""),
+        }
+    return {
+        "type": "reddit",
+        "caption": build_caption_from_reddit(candidate["item"]),
+        "image_url": get_first_valid_image_url_or_none(candidate.get("image_url")),
+        "images": candidate.get("images") or [],
+        "fallback_query": "health longevity",
+        "url": candidate.get("url"),
+        "title": candidate.get("title", ""),
+    }
+
+def select_candidate(pool: list[dict], kind: str) -> dict | None:
+    of_kind = [c for c in pool if c["type"] == kind]
+    if not of_kind:
+        return None
+    if kind == "news":
+        of_kind = [c for c in of_kind if c.get("image_url")] or of_kind
+    with metrics.span("rank", kind=kind):
+        return get_ranker().best(of_kind)
+
 def choose_item():
-    mode = POST_MODE
+    mode = current_channel().post_mode
     if mode == "auto":
         mode = random.choice(["news", "reddit"])
+    # Same fallback order as before: news falls back to reddit, reddit has no fallback
+    order = ["news", "reddit"] if mode == "news" else ["reddit"]
 
-    if mode == "news":
-        article = fetch_news_article()
-        if article and not is_blocked(article.get("title", ""), article.get("url", "")):        
-            return {
-                "type": "news",
-                "caption": build_caption_from_news(article),
-                "image_url": get_first_valid_image_url_or_none(article.get("urlToImage")),
-                "fallback_query": "health longevity wellness",
-                "url": article.get("url"),
-                "title": article.get("title", ""),
-            }
-    post = fetch_reddit_post()
-    if post and not is_blocked(post.get("title", ""), post.get("url", "")):    
-        return {
-            "type": "reddit",
-            "caption": build_caption_from_reddit(post),
-            "image_url": get_first_valid_image_url_or_none(post.get("image_url")),
-            "fallback_query": "health longevity",
-            "url": post.get("url"),
-            "title": post.get("title", ""),
-        }
+    pool = fetch_candidates()
+    with metrics.span("filter"):
+        history = get_history()
+        queue = get_queue()
+        blocklist = get_blocklist()
+        fetched = len(pool)
+        pool = [
+            c for c in pool
+            if not blocklist.is_blocked(c.get("title", ""), c.get("url", ""))
+            and not history.is_duplicate(c.get("url"), c.get("title"))
+            and not queue.is_queued(c.get("url"))
+        ]
+    metrics.inc("curator_candidates_total", fetched, result="fetched")
+    metrics.inc("curator_candidates_total", len(pool), result="kept")
+    logger.info(f"[Bot] {len(pool)} candidates after filtering")
+    for kind in order:
+        candidate = select_candidate(pool, kind)
+        if candidate:
+            return _build_item(candidate)
     return None
 
+def _image_candidates(item: dict) -> list[ImageCandidate]:
+    images = item.get("images") or ([{"url": item["image_url"]}] if item.get("image_url") else [])
+    return [ImageCandidate(get_first_valid_image_url_or_none(i["url"]), i.get("width"), i.get("height"))
+            for i in images if i.get("url")]
+
+def acquire_image(item: dict) -> dict[str, bytes]:
+    # The image stays in memory from download to upload, so concurrent channels never share a file
+    store = get_image_store()
+    platforms = [p.key for p in enabled_platforms()]  # only encode the variants this channel will upload
+    queued = get_queue().image_hashes()  # posts prepared in the same batch must not share an image either
+    candidates = []
+    for candidate in _image_candidates(item):
+        known = store.lookup(candidate.url)
+        if known:
+            # Seen this URL before: no need to download it to know whether it's usable
+            sha, image_hash = known
+            if store.is_repeat(image_hash, queued):
+                metrics.inc("curator_images_total", result="repeat")
+                logger.info(f"[Bot] Image already posted or queued, skipping: {candidate.url}")
+                continue
+            variants = cached_variants(sha, platforms)
+            if variants:
+                metrics.inc("curator_images_total", result="reused")
+                logger.info(f"[Bot] Reusing processed image for: {candidate.url}")
+                item.update(image_sha=sha, image_dhash=f"{image_hash:016x}")
+                return variants
+        candidates.append(candidate)
+
+    processed = {}
+    def accept(url, data) -> bool:
+        try:
+            with metrics.span("image_process"):
+                sha, image_hash = sha256(data).hexdigest(), dhash(data)
+                store.remember(url, sha, image_hash)
+                if store.is_repeat(image_hash, queued):
+                    metrics.inc("curator_images_total", result="repeat")
+                    logger.info("[Bot] Image looks like one already posted or queued, trying next source")
+                    return False
+                processed["variants"] = build_variants(data, sha, platforms)
+        except Exception as e:
+            logger.warning(f"[Bot] Downloaded file is not a usable image ({e}), trying next source")
+            return False
+        metrics.inc("curator_images_total", result="downloaded")
+        item.update(image_sha=sha, image_dhash=f"{image_hash:016x}")
+        return True
+
+    # Probe every candidate size at once and download only the best one
+    with metrics.span("image_resolve"):
+        resolved = resolve_image(candidates, accept)
+    if resolved:
+        logger.info(f"[Bot] Downloaded image from: {resolved[0]}")
+        return processed["variants"]
+
+    query = item.get("fallback_query")
+    if query:
+        data = download_image(None, query=query)
+        if data is not None and accept(None, data):
+            logger.info(f"[Bot] Downloaded fallback image for query: {query}")
+            return processed["variants"]
+
+    with metrics.span("fallback_render"):
+        data = render_fallback_image(item.get("title", "Health & Longevity"))
+    logger.info("[Bot] Generated fallback text image")
+    with metrics.span("image_process"):
+        return build_variants(data, platforms=platforms)
+
+def prepare_item():
+    # Everything that talks to content sources: selection, image download and processing
+    item = choose_item()
+    if not item:
+        return None
+    return item, acquire_image(item)
+
+def prepare(target: int = QUEUE_TARGET) -> int:
+    """Top the queue up to `target` ready posts; returns how many were added."""
+    queue = get_queue()
+    added = 0
+    with metrics.run("prepare"):
+        while queue.ready_count(QUEUE_MAX_AGE) < target:
+            try:
+                prepared = prepare_item()
+            except Exception as e:
+                logger.error(f"[Prepare] Failed to prepare a post: {redact(e)}")
+                logger.error(redact(traceback.format_exc()))
+                break
+            if not prepared:
+                logger.warning("[Prepare] No suitable content to queue.")
+                break
+            post_id = queue.push(*prepared)
+            added += 1
+            logger.info(f"[Prepare] Queued post {post_id}: {prepared[0].get('title', '')}")
+        metrics.set_outcome("queued", added)
+    return added
+
+def _next_post(queue):
+    # Oldest queued post that hasn't been posted in the meantime, else prepare one on the spot
+    while True:
+        popped = queue.pop(QUEUE_MAX_AGE)
+        if not popped:
+            break
+        post_id, item, blobs = popped
+        if get_history().is_duplicate(item.get("url"), item.get("title")):
+            queue.mark(post_id, "skipped")
+            continue
+        logger.info(f"[Bot] Publishing queued post {post_id}")
+        return post_id, item, blobs
+
+    logger.info("[Bot] Queue empty, preparing a post now")
+    prepared = prepare_item()
+    if not prepared:
+        return None
+    if DRY_RUN:
+        return None, *prepared
+    # Queued like any other post, so it gets a publish journal and can be resumed
+    return queue.claim(queue.push(*prepared))
+
 def run_once():
+    with metrics.run("publish"):
+        return _publish_once()
+
+def _publish_once():
     start_time = datetime.now()
     logger.info(f"[Bot] Starting execution at {start_time}")
-    
-    start_time = datetime.now()
-    logger.info(f"[Bot] Starting execution at {start_time}")
-    
+
     try:
-        # Content selection
-        # Content selection
-        item = choose_item()
-        if not item:
-            logger.warning("[Bot] No suitable content found today.")
+        queue = get_queue()
+        post = _next_post(queue)
+        if not post:
             logger.warning("[Bot] No suitable content found today.")
             return
+        post_id, item, blobs = post
 
-        # Image handling with better error tracking
-        # Image handling with better error tracking
-        image_path = "image.jpg"
-        image_success = False
-        
-        image_success = False
-        
-        if item.get("image_url"):
-            image_success = download_image_to_path(item["image_url"], image_path)
-            if image_success:
-                logger.info(f"[Bot] Downloaded image from: {item['image_url']}")
-        
-        if not image_success and item.get("fallback_query"):
-            image_success = download_image_to_path(None, image_path, query=item["fallback_query"])
-            if image_success:
-                logger.info(f"[Bot] Downloaded fallback image for query: {item['fallback_query']}")
-        
-        if not image_success:
-            image_success = download_image_to_path(item["image_url"], image_path)
-            if image_success:
-                logger.info(f"[Bot] Downloaded image from: {item['image_url']}")
-        
-        if not image_success and item.get("fallback_query"):
-            image_success = download_image_to_path(None, image_path, query=item["fallback_query"])
-            if image_success:
-                logger.info(f"[Bot] Downloaded fallback image for query: {item['fallback_query']}")
-        
-        if not image_success:
-            generate_fallback_image(item.get("title", "Health & Longevity"), image_path)
-            logger.info("[Bot] Generated fallback text image")
-
+        platforms = enabled_platforms()
         if DRY_RUN:
             logger.info(f"[Dry Run] Caption: {item['caption']}")
-            logger.info(f"[Dry Run] Image path: {image_path}")
-            logger.info("[Dry Run] Would post to: Twitter/X, Instagram, Facebook, Bluesky")
+            for key, data in blobs.items():
+                logger.info(f"[Dry Run] {key} image: {len(data)} bytes")
+            logger.info("[Dry Run] Would post to: " + ", ".join(p.name for p in platforms))
+            if post_id is not None:
+                queue.mark(post_id, "ready")  # leave it for the real run
             return
 
-        # Post to platforms with individual error handling
-        platforms = [
-            ("Twitter/X", post_to_twitter),
-            ("Instagram", post_to_instagram),
-            ("Facebook", post_to_facebook),
-            ("Bluesky", post_to_bluesky)
-        ]
-        
-        success_count = 0
-        for platform_name, post_func in platforms:
-            try:
-                logger.info(f"[Bot] Posting to {platform_name}...")
-                post_func(item["caption"], image_path)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"[Bot] Failed to post to {platform_name}: {str(e)}")
-
+        results = _deliver(queue, post_id, item, blobs, platforms)
         execution_time = (datetime.now() - start_time).total_seconds()
-        logger.info(f"[Bot] Completed in {execution_time:.2f}s. Posted to {success_count}/4 platforms.")
-        logger.info("[Bot] Generated fallback text image")
+        logger.info(f"[Bot] Completed in {execution_time:.2f}s. Posted to {sum(r.success for r in results)}/{len(results)} platforms.")
+        return results
 
-        if DRY_RUN:
-            logger.info(f"[Dry Run] Caption: {item['caption']}")
-            logger.info(f"[Dry Run] Image path: {image_path}")
-            logger.info("[Dry Run] Would post to: Twitter/X, Instagram, Facebook, Bluesky")
-            return
+    except Exception as e:
+        logger.error(f"[Bot] Critical error: {redact(e)}")
+        logger.error(redact(traceback.format_exc()))
 
-        # Post to platforms with individual error handling
-        platforms = [
-            ("Twitter/X", post_to_twitter),
-            ("Instagram", post_to_instagram),
-            ("Facebook", post_to_facebook),
-            ("Bluesky", post_to_bluesky)
-        ]
-        
-        success_count = 0
-        for platform_name, post_func in platforms:
-            try:
-                logger.info(f"[Bot] Posting to {platform_name}...")
-                post_func(item["caption"], image_path)
-                success_count += 1
-            except Exception as e:
-                logger.error(f"[Bot] Failed to post to {platform_name}: {str(e)}")
+def _deliver(queue, post_id, item, blobs, platforms):
+    # Publish to every platform this post hasn't reached yet, journaling each one (see content_queue.py)
+    deliveries = queue.deliveries(post_id, item, [p.key for p in platforms])
+    todo = [p for p in platforms if deliveries[p.key].status == "pending"
+            or (deliveries[p.key].status == "failed" and deliveries[p.key].attempts < MAX_PUBLISH_ATTEMPTS)]
+    for p in platforms:
+        if deliveries[p.key].status == "unknown":
+            logger.warning(f"[Bot] {p.name}: upload never reported back (crash or hung past its deadline) and may have gone through; not retrying")
 
-        execution_time = (datetime.now() - start_time).total_seconds()
-        logger.info(f"[Bot] Completed in {execution_time:.2f}s. Posted to {success_count}/4 platforms.")
+    missing = [p.key for p in todo if p.key not in blobs]
+    if missing and blobs:
+        # Enabled after the post was queued: derive its variant from the largest one we have
+        with metrics.span("image_process"):
+            blobs = {**blobs, **build_variants(max(blobs.values(), key=len), platforms=missing)}
 
-    except Exception as e:
-        logger.error(f"[Bot] Critical error: {str(e)}")
-        logger.error(traceback.format_exc())
+    # Post to all platforms concurrently, each with its own deadline
+    logger.info(f"[Bot] Publishing post {post_id} to {len(todo)} platforms...")
+    results = publish_all(item["caption"], blobs, todo, deliveries)
+
+    for r in results:
+        if r.success:
+            logger.info(f"[Bot] {r.platform}: posted in {r.latency:.2f}s")
+        else:
+            logger.error(f"[Bot] Failed to post to {r.platform} after {r.latency:.2f}s: {r.error}")
+    metrics.set_outcome("platforms", {r.platform: r.success for r in results})
+
+    done = [d for d in deliveries.values() if d.done]
+    history = get_history()
+    # Recorded by whichever run first sees a success, which may be resume() after a late upload
+    if done and not history.is_duplicate(item.get("url"), item.get("title")):
+        history.record(item.get("url"), item.get("title"), item["type"])
+        if item.get("image_sha"):
+            get_image_store().mark_posted(item["image_sha"], int(item["image_dhash"], 16))
+    retryable = [d for d in deliveries.values() if d.status == "failed" and d.attempts < MAX_PUBLISH_ATTEMPTS]
+    # Uploads past their deadline are still running; resume() settles them once they finish or go stale
+    outstanding = [d for d in deliveries.values() if d.status == "sending"]
+    if retryable or outstanding:
+        status = "retry"  # keep the caption and images for resume()
+    else:
+        status = "published" if done else "failed"
+    queue.mark(post_id, status)
+    return results
+
+def resume():
+    """Finish posts whose publish failed on some platforms (or was cut short by a crash).
+
+    Only the missing platform steps are redone, with the queued caption and images.
+    """
+    with metrics.run("resume"):
+        queue = get_queue()
+        results = []
+        try:
+            while True:
+                claimed = queue.pop_retry()
+                if not claimed:
+                    break
+                post_id, item, blobs = claimed
+                logger.info(f"[Resume] Retrying post {post_id}: {item.get('title', '')}")
+                results += _deliver(queue, post_id, item, blobs, enabled_platforms())
+        except Exception as e:
+            logger.error(f"[Resume] Critical error: {redact(e)}")
+            logger.error(redact(traceback.format_exc()))
+        return results
@@ -0,0 +1,90 @@
+# channels.py - per-feed configuration so many curated channels can share one process
+#
+# Without CHANNELS_FILE there is a single "default" channel built from the usual env vars.
+# CHANNELS_FILE is a JSON list of channels, e.g.
+#   [{"name": "sleep", "hashtags": "#Sleep #Health", "reddit_subs": ["sleep"],
+#     "news_query": "sleep AND (study OR research)", "post_times": ["08:30", "18:00"],
+#     "env_prefix": "SLEEP_"}]
+# Platform credentials are read from <env_prefix><NAME> (e.g. SLEEP_TWITTER_API_KEY) or the
+# channel's "env" mapping; only the source API keys in SHARED_SETTINGS fall back to the plain env var.
+
+import contextvars
+import json
+import os
+from dataclasses import dataclass, field
+
+CHANNELS_FILE = os.getenv("CHANNELS_FILE")
+
+SHARED_SETTINGS = {
+    "NEWSAPI_KEY", "REDDIT_CLIENT_ID", "REDDIT_CLIENT_SECRET", "REDDIT_USER_AGENT", "UNSPLASH_ACCESS_KEY", "FEED_URLS",
+}
+
+DEFAULT_HASHTAGS = "#Longevity #Health #Wellness #Biohacking"
+DEFAULT_NEWS_QUERY = "(longevity OR \"healthspan\" OR \"anti-aging\" OR \"healthy aging\" OR nutrition OR exercise OR sleep) AND (study OR research OR science OR evidence OR trial)"
+DEFAULT_REDDIT_SUBS = ["Longevity","Nutrition","Biohackers","HealthyFood","Fitness"]
+
+@dataclass
+class Channel:
+    name: str = "default"
+    post_mode: str = field(default_factory=lambda: os.getenv("POST_MODE", "auto").lower())  # auto/news/reddit
+    hashtags: str = DEFAULT_HASHTAGS
+    news_query: str = DEFAULT_NEWS_QUERY
+    reddit_subs: list[str] = field(default_factory=lambda: list(DEFAULT_REDDIT_SUBS))
+    post_times: list[str] = field(default_factory=lambda: [os.getenv("POST_TIME", "09:00")])  # HH:MM 24h
+    timezone: str = field(default_factory=lambda: os.getenv("TIMEZONE", "Australia/Brisbane"))
+    env_prefix: str = ""
+    env: dict[str, str] = field(default_factory=dict)
+    data_dir: str = ""  # where this channel's history/queue/session files live; "" = working dir
+
+    def setting(self, name: str, default: str | None = None) -> str | None:
+        if name in self.env:
+            return self.env[name]
+        if self.env_prefix and os.getenv(self.env_prefix + name) is not None:
+            return os.getenv(self.env_prefix + name)
+        if self.name == "default" or name in SHARED_SETTINGS:
+            return os.getenv(name, default)
+        return default
+
+    def path(self, filename: str) -> str:
+        if not self.data_dir or os.path.isabs(filename):
+            return filename
+        os.makedirs(self.data_dir, exist_ok=True)
+        return os.path.join(self.data_dir, filename)
+
+def load_channels(path: str | None = CHANNELS_FILE) -> list[Channel]:
+    if not path:
+        return [Channel()]
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    channels = []
+    for entry in raw:
+        entry = dict(entry)
+        entry.setdefault("data_dir", os.path.join("channels", entry["name"]))
+        if "post_mode" in entry:
+            entry["post_mode"] = entry["post_mode"].lower()
+        channels.append(Channel(**entry))
+    names = [c.name for c in channels]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate channel names in {path}")
+    return channels
+
+_default = Channel()
+_current = contextvars.ContextVar("channel", default=_default)
+
+def current_channel() -> Channel:
+    return _current.get()
+
+def setting(name: str, default: str | None = None) -> str | None:
+    return current_channel().setting(name, default)
+
+def run_in_channel(channel: Channel, func, *args, **kwargs):
+    """Run func with `channel` as the current channel (used as the scheduler job target)."""
+    token = _current.set(channel)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _current.reset(token)
+
+def submit(pool, func, *args, **kwargs):
+    # Executor threads don't inherit context vars; carry the current channel across
+    return pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
@@ -0,0 +1,128 @@
+# clients.py - authenticated platform clients, created once per process and reused
+#
+# tweepy and atproto are imported when a client is first built, so runs that don't post to
+# Twitter/X or Bluesky never load them (see plugins.py).
+
+import os
+import re
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from channels import current_channel
+
+BLUESKY_SESSION_FILE = os.getenv("BLUESKY_SESSION_FILE", ".bluesky_session")
+BLUESKY_BASE_URL = os.getenv("BLUESKY_BASE_URL")  # e.g. https://bsky.social/xrpc; None = atproto default
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+
+_QUERY = re.compile(r"(https?://[^\s?#]+)\?[^\s#]*")
+
+_lock = threading.Lock()
+_clients = {}  # "http" is shared by every channel; platform clients are keyed (channel, platform)
+_build_locks = {}
+
+def _build_lock(key) -> threading.Lock:
+    # One lock per client, so a slow login for one channel doesn't hold up the others
+    with _lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+class _DefaultTimeout(HTTPAdapter):
+    # For sessions owned by a client library that doesn't pass a timeout itself (tweepy.Client)
+    def __init__(self, timeout: float, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+def http_session() -> requests.Session:
+    # One keep-alive pool shared by every plain HTTP call (Graph API, NewsAPI, image downloads)
+    with _lock:
+        if "http" not in _clients:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _clients["http"] = session
+        return _clients["http"]
+
+def redact(text) -> str:
+    """text (an exception message, a traceback) without URL query strings, which carry API keys and tokens."""
+    return _QUERY.sub(r"\1?...", str(text))
+
+def twitter_clients():
+    # (v1.1 API for media upload, v2 Client for posting)
+    import tweepy
+    from publishing import platform_deadline
+    channel = current_channel()
+    with _build_lock((channel.name, "twitter")):
+        if (channel.name, "twitter") not in _clients:
+            keys = (
+                channel.setting("TWITTER_API_KEY"),
+                channel.setting("TWITTER_API_SECRET"),
+                channel.setting("TWITTER_ACCESS_TOKEN"),
+                channel.setting("TWITTER_ACCESS_SECRET"),
+            )
+            # Socket timeouts within the platform's deadline, so a hung upload fails instead of holding its thread
+            timeout = platform_deadline("twitter")
+            api_v1 = tweepy.API(tweepy.OAuth1UserHandler(*keys), timeout=timeout)
+            client = tweepy.Client(
+                consumer_key=keys[0],
+                consumer_secret=keys[1],
+                access_token=keys[2],
+                access_token_secret=keys[3],
+            )
+            client.session.mount("https://", _DefaultTimeout(timeout))
+            _clients[(channel.name, "twitter")] = (api_v1, client)
+        return _clients[(channel.name, "twitter")]
+
+def _load_bluesky_session(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def _session_saver(path: str):
+    from atproto import SessionEvent
+    def save(event, session):
+        if event in (SessionEvent.CREATE, SessionEvent.REFRESH):
+            try:
+                with open(path, "w") as f:
+                    f.write(session.export())
+            except OSError as e:
+                print("[Bluesky][WARN] Could not cache session:", e)
+    return save
+
+def bluesky_client():
+    from atproto import Client as BlueskyClient, Request
+    from publishing import platform_deadline
+    channel = current_channel()
+    with _build_lock((channel.name, "bluesky")):
+        if (channel.name, "bluesky") in _clients:
+            return _clients[(channel.name, "bluesky")]
+        handle = channel.setting("BLUESKY_HANDLE")
+        password = channel.setting("BLUESKY_PASSWORD")
+        if not handle or not password:
+            raise ValueError("Bluesky credentials not set in environment variables.")
+
+        client = BlueskyClient(base_url=BLUESKY_BASE_URL, request=Request(timeout=platform_deadline("bluesky")))
+        session_file = channel.path(BLUESKY_SESSION_FILE)
+        client.on_session_change(_session_saver(session_file))
+        session_string = _load_bluesky_session(session_file)
+        logged_in = False
+        if session_string:
+            # The client refreshes an expired access token itself; only a dead refresh token needs a new login
+            try:
+                client.login(session_string=session_string)
+                logged_in = True
+            except Exception as e:
+                print("[Bluesky] Cached session rejected, logging in again:", e)
+        if not logged_in:
+            client.login(handle, password)
+        _clients[(channel.name, "bluesky")] = client
+        return client
+
+def reset_client(platform: str):
+    # Drop the current channel's cached client so the next call rebuilds it (e.g. after an auth failure)
+    with _lock:
+        _clients.pop((current_channel().name, platform), None)
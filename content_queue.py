@@ -0,0 +1,220 @@
+# content_queue.py - durable queue of fully prepared posts (caption + processed images)
+#
+# The deliveries table is the publish journal: one row per (post, platform) with an idempotency
+# key, the outcome, the platform's post ID and any intermediate IDs (e.g. Instagram's creation_id).
+# A post whose deliveries didn't all succeed is left in 'retry' with its images, so resume() in
+# bot.py can redo just the missing platforms.
+
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from hashlib import sha256
+from history import normalize_url
+from sqlite_store import SQLiteStore, per_channel
+
+QUEUE_DB = os.getenv("QUEUE_DB", "queue.db")
+MAX_PUBLISH_ATTEMPTS = int(os.getenv("MAX_PUBLISH_ATTEMPTS", "3"))  # per platform, before a post is given up
+RESUME_AFTER = float(os.getenv("RESUME_AFTER_MINUTES", "15")) * 60  # a post still 'publishing' this long was interrupted
+
+class ContentQueue(SQLiteStore):
+    def __init__(self, path: str = QUEUE_DB):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'ready',
+                url TEXT,
+                item TEXT,
+                created_at REAL,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_posts_status ON posts (status, id);
+            CREATE TABLE IF NOT EXISTS images (
+                hash TEXT PRIMARY KEY,
+                data BLOB
+            );
+            CREATE TABLE IF NOT EXISTS post_images (
+                post_id INTEGER,
+                platform TEXT,
+                hash TEXT,
+                PRIMARY KEY (post_id, platform)
+            );
+            CREATE TABLE IF NOT EXISTS deliveries (
+                post_id INTEGER,
+                platform TEXT,
+                key TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                remote_id TEXT,
+                state TEXT NOT NULL DEFAULT '{}',
+                error TEXT,
+                updated_at REAL,
+                PRIMARY KEY (post_id, platform)
+            );
+        """)
+
+    def push(self, item: dict, images: dict[str, bytes]) -> int:
+        # images maps platform key -> upload-ready bytes (see imaging.build_variants)
+        digests = {}  # platforms usually share one buffer; hash each buffer once
+        for data in images.values():
+            if id(data) not in digests:
+                digests[id(data)] = sha256(data).hexdigest()
+        now = time.time()
+        with self._lock, self._db:
+            post_id = self._db.execute(
+                "INSERT INTO posts (status, url, item, created_at, updated_at) VALUES ('ready', ?, ?, ?, ?)",
+                (normalize_url(item.get("url")), json.dumps(item), now, now),
+            ).lastrowid
+            for platform, data in images.items():
+                digest = digests[id(data)]
+                self._db.execute("INSERT OR IGNORE INTO images (hash, data) VALUES (?, ?)", (digest, data))
+                self._db.execute("INSERT INTO post_images VALUES (?, ?, ?)", (post_id, platform, digest))
+        return post_id
+
+    def ready_count(self, max_age: float | None = None) -> int:
+        since = time.time() - max_age if max_age else 0
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM posts WHERE status = 'ready' AND created_at >= ?", (since,)
+            ).fetchone()[0]
+
+    def image_hashes(self) -> list[int]:
+        """dHashes of the images of posts not yet published (ready, publishing or waiting for a retry)."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT json_extract(item, '$.image_dhash') FROM posts WHERE status IN ('ready', 'publishing', 'retry')"
+            ).fetchall()
+        return [int(h, 16) for (h,) in rows if h]
+
+    def is_queued(self, url: str | None) -> bool:
+        norm = normalize_url(url)
+        if not norm:
+            return False
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM posts WHERE url = ? AND status IN ('ready', 'publishing')", (norm,)
+            ).fetchone() is not None
+
+    def pop(self, max_age: float | None = None):
+        """Claim the oldest ready post; returns (id, item, {platform: bytes}) or None.
+
+        Posts older than max_age seconds are marked expired instead of being returned.
+        """
+        while True:
+            with self._lock, self._db:
+                row = self._db.execute(
+                    "SELECT id, item, created_at FROM posts WHERE status = 'ready' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if not row:
+                    return None
+                post_id, item, created_at = row
+                expired = max_age and time.time() - created_at > max_age
+                claimed = self._db.execute(
+                    "UPDATE posts SET status = ?, updated_at = ? WHERE id = ? AND status = 'ready'",
+                    ("expired" if expired else "publishing", time.time(), post_id),
+                ).rowcount
+                if not claimed:
+                    continue
+                if not expired:
+                    images = self._images(post_id)
+            if expired:
+                self.mark(post_id, "expired")
+                continue
+            return post_id, json.loads(item), images
+
+    def _images(self, post_id: int) -> dict[str, bytes]:
+        # Each distinct image is loaded once and shared by the platforms that use it
+        hashes = dict(self._db.execute("SELECT platform, hash FROM post_images WHERE post_id = ?", (post_id,)).fetchall())
+        blobs = {h: self._db.execute("SELECT data FROM images WHERE hash = ?", (h,)).fetchone()[0]
+                 for h in set(hashes.values())}
+        return {platform: blobs[h] for platform, h in hashes.items()}
+
+    def claim(self, post_id: int):
+        """Claim one ready post by id (e.g. right after push); same result as pop()."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT item FROM posts WHERE id = ? AND status = 'ready'", (post_id,)).fetchone()
+            if not row:
+                return None
+            self._db.execute("UPDATE posts SET status = 'publishing', updated_at = ? WHERE id = ?", (time.time(), post_id))
+            return post_id, json.loads(row[0]), self._images(post_id)
+
+    def pop_retry(self, resume_after: float = RESUME_AFTER):
+        """Claim a post left in 'retry', or one stuck in 'publishing' by a crash; same result as pop().
+
+        A 'retry' post with an upload still 'sending' (past its deadline but running) waits until
+        that upload finishes or has been silent for resume_after seconds.
+        """
+        stale = time.time() - resume_after
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT id, item FROM posts p WHERE (status = 'retry' AND NOT EXISTS ("
+                "    SELECT 1 FROM deliveries d WHERE d.post_id = p.id AND d.status = 'sending' AND d.updated_at >= ?))"
+                " OR (status = 'publishing' AND updated_at < ?) ORDER BY id LIMIT 1", (stale, stale),
+            ).fetchone()
+            if not row:
+                return None
+            post_id, item = row
+            # Uploads that were in flight when the process died, or never came back, may or may not have gone through
+            self._db.execute("UPDATE deliveries SET status = 'unknown', updated_at = ? WHERE post_id = ? AND status = 'sending'",
+                             (time.time(), post_id))
+            self._db.execute("UPDATE posts SET status = 'publishing', updated_at = ? WHERE id = ?", (time.time(), post_id))
+            return post_id, json.loads(item), self._images(post_id)
+
+    def deliveries(self, post_id: int, item: dict, platforms: list[str]) -> dict[str, "Delivery"]:
+        """The journal rows of a post for `platforms`, created as 'pending' on first use."""
+        with self._lock, self._db:
+            for platform in platforms:
+                key = sha256(f"{post_id}:{normalize_url(item.get('url'))}:{platform}".encode()).hexdigest()[:32]
+                self._db.execute("INSERT OR IGNORE INTO deliveries (post_id, platform, key, updated_at) VALUES (?, ?, ?, ?)",
+                                 (post_id, platform, key, time.time()))
+            rows = self._db.execute(
+                "SELECT platform, key, status, attempts, remote_id, state FROM deliveries WHERE post_id = ?", (post_id,)
+            ).fetchall()
+        return {platform: Delivery(self, post_id, platform, key, status, attempts, remote_id, json.loads(state))
+                for platform, key, status, attempts, remote_id, state in rows if platform in platforms}
+
+    def _update_delivery(self, delivery: "Delivery", **columns):
+        sets = ", ".join(f"{name} = ?" for name in columns)
+        with self._lock, self._db:
+            self._db.execute(f"UPDATE deliveries SET {sets}, updated_at = ? WHERE post_id = ? AND platform = ?",
+                             (*columns.values(), time.time(), delivery.post_id, delivery.platform))
+
+    def mark(self, post_id: int, status: str):
+        with self._lock, self._db:
+            self._db.execute("UPDATE posts SET status = ?, updated_at = ? WHERE id = ?", (status, time.time(), post_id))
+            if status in ("published", "failed", "expired", "skipped"):
+                # Image bytes are only needed until the post leaves the queue
+                self._db.execute("DELETE FROM post_images WHERE post_id = ?", (post_id,))
+                self._db.execute("DELETE FROM images WHERE hash NOT IN (SELECT hash FROM post_images)")
+
+@dataclass
+class Delivery:
+    """One platform's share of a queued post, written through to the journal as it progresses."""
+    queue: ContentQueue = field(repr=False)
+    post_id: int
+    platform: str
+    key: str  # idempotency key for this post on this platform
+    status: str = "pending"  # pending -> sending -> done | failed; 'unknown' if sending never came back
+    attempts: int = 0
+    remote_id: str | None = None
+    state: dict = field(default_factory=dict)
+
+    @property
+    def done(self) -> bool:
+        return self.status == "done"
+
+    def begin(self):
+        self.status, self.attempts = "sending", self.attempts + 1
+        self.queue._update_delivery(self, status=self.status, attempts=self.attempts)
+
+    def checkpoint(self, **state):
+        # Record an intermediate platform ID so a retry can continue from it instead of starting over
+        self.state.update(state)
+        self.queue._update_delivery(self, state=json.dumps(self.state))
+
+    def finish(self, success: bool, remote_id: str | None = None, error: str | None = None):
+        self.status = "done" if success else "failed"
+        self.remote_id = remote_id or self.remote_id
+        self.queue._update_delivery(self, status=self.status, remote_id=self.remote_id, error=error)
+
+get_queue = per_channel(ContentQueue, QUEUE_DB)
@@ -0,0 +1,194 @@
+# feeds.py - journal and news RSS/Atom feeds as a content source (FEED_URLS)
+#
+# Feeds are fetched concurrently with conditional GET (ETag / Last-Modified are kept in
+# source_state.py), so an unchanged feed costs one 304 and no parsing. A changed feed is parsed
+# as a stream with iterparse, which stops at the first entry we already have. Entries come out in
+# NewsAPI's article shape, so they rank, caption and post exactly like NewsAPI results.
+
+import html
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import iterparse
+from clients import http_session, redact
+from ratelimit import call
+from channels import setting, submit
+from metrics import span
+from source_state import get_source_state
+
+FEED_WINDOW_HOURS = float(os.getenv("FEED_WINDOW_HOURS", "72"))  # entries older than this are not candidates
+FEED_MAX_ENTRIES = int(os.getenv("FEED_MAX_ENTRIES", "50"))  # newest entries read from a changed feed
+FEED_WORKERS = int(os.getenv("FEED_WORKERS", "8"))
+FEED_TIMEOUT = 15
+
+_MEDIA = "{http://search.yahoo.com/mrss/}"
+_RDF_ABOUT = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}about"
+_TAG = re.compile(r"<[^>]+>")
+_IMG = re.compile(r"<img[^>]+src=[\"']([^\"']+)", re.I)
+
+logger = logging.getLogger(__name__)
+
+def feed_urls() -> list[str]:
+    # Comma- or whitespace-separated, per channel like the other source settings
+    return [u for u in re.split(r"[\s,]+", setting("FEED_URLS") or "") if u]
+
+def _local(tag: str) -> str:
+    return tag.rpartition("}")[2]
+
+def _text(value: str) -> str:
+    # Unescape first: Atom type="html" text and RSS descriptions carry their markup escaped
+    return " ".join(_TAG.sub(" ", html.unescape(value)).split())
+
+def _published(value: str | None) -> str | None:
+    # RSS dates are RFC 822, Atom and Dublin Core ISO 8601; both end up as NewsAPI's publishedAt
+    if not value:
+        return None
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _entry(elem) -> dict | None:
+    # One RSS <item> or Atom <entry>, matched by local name so RSS 1.0/2.0 and Atom all work
+    fields, image = {"id": elem.get(_RDF_ABOUT)}, None
+    for child in elem:
+        name, text = _local(child.tag), (child.text or "").strip()
+        if child.tag.startswith(_MEDIA):
+            continue
+        if name == "link":
+            href, rel = child.get("href"), child.get("rel", "alternate")
+            if href and rel == "alternate":
+                fields.setdefault("link", href)
+            elif href and rel == "enclosure" and child.get("type", "").startswith("image/"):
+                image = image or href
+            elif text:
+                fields.setdefault("link", text)
+        elif name == "enclosure" and child.get("type", "").startswith("image/"):
+            image = image or child.get("url")
+        elif name in ("guid", "id") and text:
+            fields["id"] = fields["id"] or text
+        elif name == "title":
+            fields["title"] = _text("".join(child.itertext()))
+        elif name in ("description", "summary", "encoded", "content"):
+            fields.setdefault("description", "".join(child.itertext()))
+        elif name in ("pubDate", "published", "date", "issued"):
+            fields.setdefault("published", text)
+        elif name == "updated":
+            fields.setdefault("updated", text)
+    for media in elem.iter():
+        if media.tag in (_MEDIA + "content", _MEDIA + "thumbnail") and media.get("url") \
+                and media.get("medium", "image") == "image":
+            image = image or media.get("url")
+    description = fields.get("description") or ""
+    if not image:
+        match = _IMG.search(description)
+        image = html.unescape(match[1]) if match else None
+    link = fields.get("link")
+    if not (link and fields.get("title")):
+        return None
+    return {"id": fields["id"] or link, "title": fields["title"], "url": link, "image": image,
+            "description": _text(description)[:500],
+            "published": _published(fields.get("published") or fields.get("updated"))}
+
+def parse_feed(stream, is_known, limit: int = FEED_MAX_ENTRIES) -> tuple[str, list[dict]]:
+    """(feed title, new entries in feed order), stopping at the first entry is_known(id) accepts."""
+    title, entries, depth = "", [], 0
+    for event, elem in iterparse(stream, events=("start", "end")):
+        name = _local(elem.tag)
+        if name in ("item", "entry"):
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            entry = _entry(elem)
+            elem.clear()  # keep memory flat however long the feed is
+            if entry is None:
+                continue
+            if is_known(entry["id"]) or len(entries) >= limit:
+                break
+            entries.append(entry)
+        elif event == "end" and name == "title" and not depth and not title:
+            title = _text(elem.text or "")
+    return title, entries
+
+def _get_feed(url: str, headers: dict):
+    r = http_session().get(url, headers=headers, timeout=FEED_TIMEOUT, stream=True)
+    if r.status_code >= 400:
+        r.close()
+        r.raise_for_status()
+    return r
+
+def fetch_feed(url: str) -> int:
+    """Store the entries a feed gained since the last fetch; returns how many were new."""
+    state = get_source_state()
+    source = f"feed:{url}"
+    cursor = state.cursor(source)
+    headers = {"Accept": "application/rss+xml, application/atom+xml, application/xml;q=0.9, */*;q=0.8"}
+    if cursor.get("etag"):
+        headers["If-None-Match"] = cursor["etag"]
+    if cursor.get("last_modified"):
+        headers["If-Modified-Since"] = cursor["last_modified"]
+    host = urlsplit(url).hostname or url
+    resp = call(f"feed:{host}", _get_feed, url, headers, retries=2, base_delay=2)
+    with resp:
+        if resp.status_code == 304:
+            return 0
+        resp.raw.decode_content = True
+        title, entries = parse_feed(resp.raw, lambda id_: bool(state.known(source, [id_])))
+
+    now = time.time()
+    cutoff = now - FEED_WINDOW_HOURS * 3600
+    name = title or cursor.get("title") or host
+    articles, published = {}, {}
+    for e in entries:
+        if e["published"]:
+            at = datetime.fromisoformat(e["published"].replace("Z", "+00:00")).timestamp()
+        else:
+            # Undated entries count as published when first seen
+            at, e["published"] = now, datetime.fromtimestamp(now, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        if at < cutoff:
+            continue
+        articles[e["id"]] = {"source": {"id": None, "name": name}, "author": None, "title": e["title"],
+                             "description": e["description"], "url": e["url"], "urlToImage": e["image"],
+                             "publishedAt": e["published"]}
+        published[e["id"]] = at
+    if articles:
+        state.add(source, articles, published)
+    # Validators are only saved once the body was parsed, so a failed parse is refetched in full
+    state.set_cursor(source, etag=resp.headers.get("ETag"), last_modified=resp.headers.get("Last-Modified"), title=name)
+    return len(articles)
+
+def fetch_feed_articles() -> list[dict]:
+    """Recent articles from every feed in FEED_URLS, in NewsAPI's article shape."""
+    urls = feed_urls()
+    if not urls:
+        return []
+    added = 0
+    with span("fetch", upstream="feeds"):
+        with ThreadPoolExecutor(max_workers=min(FEED_WORKERS, len(urls)), thread_name_prefix="feeds") as pool:
+            futures = {url: submit(pool, fetch_feed, url) for url in urls}
+        for url, future in futures.items():
+            try:
+                added += future.result()
+            except Exception as e:
+                # The entries we already have are still candidates
+                logger.warning(f"[Feeds] {url} fetch failed: {redact(e)}")
+    logger.info(f"[Feeds] {added} new entries from {len(urls)} feeds")
+    state = get_source_state()
+    cutoff = time.time() - FEED_WINDOW_HOURS * 3600
+    articles = []
+    for url in urls:
+        state.prune(f"feed:{url}", cutoff)
+        articles += state.entries(f"feed:{url}", cutoff).values()
+    return articles
@@ -0,0 +1,114 @@
+# history.py - persistent record of what has already been posted
+
+import os
+import re
+import time
+from hashlib import blake2b
+from urllib.parse import urlsplit, parse_qsl, urlencode
+from sqlite_store import SQLiteStore, per_channel, signed64, hash_bands, band_match, any_within
+
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+NEAR_DUP_DISTANCE = int(os.getenv("NEAR_DUP_DISTANCE", "3"))  # max differing SimHash bits, at most 3
+TITLE_BANDS = 4  # 16-bit bands: finds every title within 3 bits
+
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "igshid", "mc_cid", "mc_eid", "ref", "ref_src", "cmpid", "smid"}
+_WORD = re.compile(r"[a-z0-9]+")
+
+def normalize_url(url: str | None) -> str:
+    if not url:
+        return ""
+    url = url.strip().replace("&amp;", "&")
+    try:
+        parts = urlsplit(url)
+        host = (parts.hostname or "").lower()
+    except ValueError:
+        return url  # malformed (e.g. an unclosed IPv6 bracket): compared as is
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    # Scheme and fragment are dropped: http/https and #anchors point at the same story
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else "")
+
+def _features(title: str) -> list[str]:
+    # Words and word pairs: with words alone, "coffee linked to lower mortality" and "tea linked to
+    # lower mortality" differ in one feature of a handful and hash within a few bits of each other
+    words = _WORD.findall(title.lower())
+    return sorted(set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])})
+
+def simhash(title: str) -> int:
+    weights = [0] * 64
+    for feature in _features(title):
+        h = int.from_bytes(blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+class PostHistory(SQLiteStore):
+    def __init__(self, path: str = HISTORY_DB, max_distance: int = NEAR_DUP_DISTANCE):
+        self.max_distance = min(max_distance, TITLE_BANDS - 1)
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS posts (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE,
+                title TEXT,
+                simhash INTEGER,
+                kind TEXT,
+                posted_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS title_bands (
+                band INTEGER,
+                value INTEGER,
+                post_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_title_bands ON title_bands (band, value);
+        """)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._reindex()
+
+    def _reindex(self):
+        # Histories written with word-only features and 8 bands: rehash the stored titles
+        with self._lock, self._db:
+            rows = self._db.execute("SELECT id, title FROM posts").fetchall()
+            self._db.execute("DELETE FROM title_bands")
+            for post_id, title in rows:
+                h = simhash(title or "")
+                self._db.execute("UPDATE posts SET simhash = ? WHERE id = ?", (signed64(h), post_id))
+                if _features(title or ""):
+                    self._db.executemany("INSERT INTO title_bands (band, value, post_id) VALUES (?, ?, ?)",
+                                         [(band, value, post_id) for band, value in hash_bands(h, TITLE_BANDS)])
+            self._db.execute("PRAGMA user_version = 1")
+
+    def is_duplicate(self, url: str | None, title: str | None) -> bool:
+        norm = normalize_url(url)
+        with self._lock:
+            if norm and self._db.execute("SELECT 1 FROM posts WHERE url = ?", (norm,)).fetchone():
+                return True
+            if not title or not _features(title):
+                return False
+            h = simhash(title)
+            clause, args = band_match(h, TITLE_BANDS)
+            rows = self._db.execute(
+                f"SELECT DISTINCT p.simhash FROM title_bands b JOIN posts p ON p.id = b.post_id WHERE {clause}",
+                args,
+            ).fetchall()
+        return any_within((other for (other,) in rows), h, self.max_distance)
+
+    def record(self, url: str | None, title: str | None, kind: str = ""):
+        norm = normalize_url(url)
+        h = simhash(title or "")
+        with self._lock, self._db:
+            cur = self._db.execute(
+                "INSERT OR IGNORE INTO posts (url, title, simhash, kind, posted_at) VALUES (?, ?, ?, ?, ?)",
+                (norm or None, title or "", signed64(h), kind, time.time()),
+            )
+            if cur.rowcount and _features(title or ""):
+                self._db.executemany(
+                    "INSERT INTO title_bands (band, value, post_id) VALUES (?, ?, ?)",
+                    [(band, value, cur.lastrowid) for band, value in hash_bands(h, TITLE_BANDS)],
+                )
+
+get_history = per_channel(PostHistory, HISTORY_DB)
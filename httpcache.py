@@ -0,0 +1,133 @@
+# httpcache.py - on-disk HTTP GET cache with TTLs, LRU size bound and conditional revalidation
+
+import json
+import os
+import threading
+import time
+from hashlib import sha256
+from urllib.parse import urlencode, urlsplit, urlunsplit
+import requests
+from requests.structures import CaseInsensitiveDict
+from clients import http_session
+from sqlite_store import SQLiteStore
+
+HTTP_CACHE_DB = os.getenv("HTTP_CACHE_DB", "http_cache.db")
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+def _without_query(url: str) -> str:
+    # The query string carries API keys (apiKey, client_id) and is already part of the cache key;
+    # it is neither stored nor put into raise_for_status() messages
+    return urlunsplit(urlsplit(url)._replace(query="", fragment=""))
+
+class CachedResponse:
+    def __init__(self, url, status_code, headers, content, from_cache=False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.from_cache = from_cache
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+class HttpCache(SQLiteStore):
+    def __init__(self, path: str = HTTP_CACHE_DB, max_bytes: int = HTTP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                url TEXT,
+                status INTEGER,
+                headers TEXT,
+                body BLOB,
+                size INTEGER,
+                expires_at REAL,
+                last_used REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used);
+        """)
+        with self._db:
+            # Entries written before URLs were stored without their query string
+            self._db.execute("UPDATE entries SET url = substr(url, 1, instr(url, '?') - 1) WHERE instr(url, '?') > 0")
+
+    @staticmethod
+    def key(url: str, params: dict | None) -> str:
+        query = urlencode(sorted((params or {}).items()))
+        return sha256(f"{url}?{query}".encode()).hexdigest()
+
+    def _load(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT url, status, headers, body, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None, 0
+        url, status, headers, body, expires_at = row
+        return CachedResponse(url, status, json.loads(headers), body, from_cache=True), expires_at
+
+    def _touch(self, key, expires_at=None):
+        with self._lock, self._db:
+            if expires_at is None:
+                self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            else:
+                self._db.execute("UPDATE entries SET last_used = ?, expires_at = ? WHERE key = ?",
+                                 (time.time(), expires_at, key))
+
+    def _store(self, key, resp, ttl):
+        # Only the validators and content type are needed to replay and revalidate
+        headers = {k: v for k, v in resp.headers.items() if k.lower() in ("etag", "last-modified", "content-type")}
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, _without_query(resp.url), resp.status_code, json.dumps(headers), resp.content, len(resp.content), now + ttl, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_used").fetchall():
+            self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get(self, url: str, params: dict | None = None, ttl: float = 3600, timeout: float = 15, session=None):
+        key = self.key(url, params)
+        cached, expires_at = self._load(key)
+        if cached and time.time() < expires_at:
+            self._touch(key)
+            return cached
+
+        headers = {}
+        if cached:
+            if cached.headers.get("etag"):
+                headers["If-None-Match"] = cached.headers["etag"]
+            if cached.headers.get("last-modified"):
+                headers["If-Modified-Since"] = cached.headers["last-modified"]
+        resp = (session or http_session()).get(url, params=params, headers=headers, timeout=timeout)
+        if cached and resp.status_code == 304:
+            self._touch(key, time.time() + ttl)
+            return cached
+        if resp.status_code == 200:
+            self._store(key, resp, ttl)
+        return CachedResponse(_without_query(resp.url), resp.status_code, resp.headers, resp.content)
+
+_default = None
+_default_lock = threading.Lock()
+
+def get_cache() -> HttpCache:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = HttpCache()
+        return _default
+
+def cached_get(url: str, params: dict | None = None, ttl: float = 3600, timeout: float = 15, session=None):
+    return get_cache().get(url, params=params, ttl=ttl, timeout=timeout, session=session)
@@ -0,0 +1,79 @@
+# image_store.py - what images we have seen and posted, by URL, content hash and perceptual hash
+#
+# Lets the pipeline skip a download whose URL it already knows (reusing the cached variants),
+# and reject images that look like one already posted even when the bytes or URL differ
+# (re-encoded stock photos, resized Reddit previews). Perceptual hashes are 64-bit dHashes
+# (imaging.dhash); near matches are found with the same 8-band index history.py uses for titles.
+
+import os
+import time
+from history import normalize_url
+from sqlite_store import SQLiteStore, per_channel, BANDS, signed64, unsigned64, hash_bands, band_match, any_within
+
+IMAGE_STORE_DB = os.getenv("IMAGE_STORE_DB", "images.db")
+IMAGE_DUP_DISTANCE = int(os.getenv("IMAGE_DUP_DISTANCE", "6"))  # max differing dHash bits, at most 7
+
+class ImageStore(SQLiteStore):
+    def __init__(self, path: str = IMAGE_STORE_DB, max_distance: int = IMAGE_DUP_DISTANCE):
+        self.max_distance = min(max_distance, BANDS - 1)
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS images (
+                sha TEXT PRIMARY KEY,
+                dhash INTEGER,
+                seen_at REAL,
+                posted_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS image_urls (
+                url TEXT PRIMARY KEY,
+                sha TEXT
+            );
+            CREATE TABLE IF NOT EXISTS image_bands (
+                band INTEGER,
+                value INTEGER,
+                sha TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_image_bands ON image_bands (band, value);
+        """)
+
+    def lookup(self, url: str | None) -> tuple[str, int] | None:
+        """(content hash, dHash) of the image last downloaded from url, if any."""
+        norm = normalize_url(url)
+        if not norm:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT i.sha, i.dhash FROM image_urls u JOIN images i ON i.sha = u.sha WHERE u.url = ?", (norm,)
+            ).fetchone()
+        return (row[0], unsigned64(row[1])) if row else None
+
+    def remember(self, url: str | None, sha: str, dhash: int):
+        norm = normalize_url(url)
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO images (sha, dhash, seen_at) VALUES (?, ?, ?)",
+                             (sha, signed64(dhash), time.time()))
+            if norm:
+                self._db.execute("INSERT OR REPLACE INTO image_urls (url, sha) VALUES (?, ?)", (norm, sha))
+
+    def is_repeat(self, dhash: int, queued: list[int] = ()) -> bool:
+        """Whether an already posted image, or one of `queued` (images of posts yet to go out), is within
+        max_distance bits of dhash."""
+        if any_within(queued, dhash, self.max_distance):
+            return True
+        clause, args = band_match(dhash)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT DISTINCT i.dhash FROM image_bands b JOIN images i ON i.sha = b.sha WHERE {clause}", args
+            ).fetchall()
+        return any_within((other for (other,) in rows), dhash, self.max_distance)
+
+    def mark_posted(self, sha: str, dhash: int):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR IGNORE INTO images (sha, dhash, seen_at) VALUES (?, ?, ?)",
+                             (sha, signed64(dhash), time.time()))
+            updated = self._db.execute("UPDATE images SET posted_at = ? WHERE sha = ? AND posted_at IS NULL",
+                                       (time.time(), sha)).rowcount
+            if updated:
+                self._db.executemany("INSERT INTO image_bands (band, value, sha) VALUES (?, ?, ?)",
+                                     [(band, value, sha) for band, value in hash_bands(dhash)])
+
+get_image_store = per_channel(ImageStore, IMAGE_STORE_DB)
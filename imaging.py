@@ -1,82 +1,389 @@
 # imaging.py
-import asyncio
-import aiohttp
-from typing import Optional
+import io
 import os
-import requests
-from PIL import Image, ImageDraw, ImageFont
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from hashlib import sha256
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+from clients import http_session
+from channels import setting, submit
+from ratelimit import with_retries
+from metrics import span, add_bytes
 
-UNSPLASH_ACCESS_KEY = os.getenv("UNSPLASH_ACCESS_KEY")
+UNSPLASH_ENDPOINT = os.getenv("UNSPLASH_ENDPOINT", "https://api.unsplash.com/photos/random")
+VARIANT_DIR = os.getenv("IMAGE_VARIANT_DIR", os.path.join(".cache", "variants"))
+VARIANT_CACHE_BYTES = int(os.getenv("IMAGE_VARIANT_CACHE_BYTES", str(200 * 1024 * 1024)))  # least recently used go first
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))  # larger downloads are abandoned
+DOWNLOAD_CHUNK = 64 * 1024
+TARGET_IMAGE_SIDE = int(os.getenv("TARGET_IMAGE_SIDE", "1080"))  # smallest candidate at least this big wins
+IMAGE_DEADLINE = float(os.getenv("IMAGE_DEADLINE", "12"))  # seconds for probing + downloading one item's image
+PROBE_TIMEOUT = float(os.getenv("IMAGE_PROBE_TIMEOUT", "4"))
+PROBE_BYTES = 32 * 1024  # enough of the file for PIL to read the dimensions
+
+# Upload limits per platform: longest side in px, payload bytes, allowed width/height ratio
+PLATFORM_IMAGE_LIMITS = {
+    "twitter": {"max_side": 4096, "max_bytes": 5 * 1024 * 1024, "aspect": None},
+    "instagram": {"max_side": 1440, "max_bytes": 8 * 1024 * 1024, "aspect": (4 / 5, 1.91)},
+    "facebook": {"max_side": 2048, "max_bytes": 4 * 1024 * 1024, "aspect": None},
+    "bluesky": {"max_side": 2000, "max_bytes": 1_000_000, "aspect": None},
+}
 
 def get_first_valid_image_url_or_none(url: str | None) -> str | None:
     if not url:
         return None
     return url.replace("&amp;","&")
 
+@with_retries("unsplash", retries=2)
+def _unsplash_request(params: dict) -> dict:
+    # Not cached: every call should return a different photo
+    r = http_session().get(UNSPLASH_ENDPOINT, params=params, timeout=15)
+    r.raise_for_status()
+    return r.json()
+
 def _unsplash_random(query: str) -> str | None:
-    if not UNSPLASH_ACCESS_KEY:
+    access_key = setting("UNSPLASH_ACCESS_KEY")
+    if not access_key:
         return None
     try:
-        r = requests.get("https://api.unsplash.com/photos/random", params={"query":query,"client_id":UNSPLASH_ACCESS_KEY}, timeout=15)
-        r.raise_for_status()
-        data = r.json()
+        with span("fetch", upstream="unsplash"):
+            data = _unsplash_request({"query":query,"client_id":access_key})
         return (data.get("urls") or {}).get("regular")
     except Exception:
         return None
 
-def download_image_to_path(url: str | None, path: str, query: str | None = None) -> bool:
+def download_image(url: str | None, query: str | None = None, timeout: float = 20) -> bytes | None:
+    """Stream the image (or an Unsplash photo for `query`) into memory, giving up past MAX_IMAGE_BYTES."""
     try:
         candidate = url
         if not candidate and query:
             candidate = _unsplash_random(query)
         if not candidate:
-            return False
-        resp = requests.get(candidate, timeout=20)
-        resp.raise_for_status()
-        with open(path, "wb") as f:
-            f.write(resp.content)
-        return True
+            return None
+        with span("image_download"):
+            with http_session().get(candidate, timeout=timeout, stream=True) as resp:
+                resp.raise_for_status()
+                if int(resp.headers.get("Content-Length") or 0) > MAX_IMAGE_BYTES:
+                    return None
+                chunks, size = [], 0
+                for chunk in resp.iter_content(DOWNLOAD_CHUNK):
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        return None
+                    chunks.append(chunk)
+        add_bytes("image_download", size)
+        return b"".join(chunks)
     except Exception:
-        return False
+        return None
+
+@dataclass
+class ImageCandidate:
+    url: str
+    width: int | None = None
+    height: int | None = None
+    length: int | None = None  # bytes, from Content-Range / Content-Length
+    content_type: str | None = None
+
+    @property
+    def side(self) -> int | None:
+        return max(self.width, self.height) if self.width and self.height else None
 
-def generate_fallback_image(text: str, path: str, size=(1200,675)):
-    img = Image.new("RGB", size, color=(240,247,245))
-    draw = ImageDraw.Draw(img)
+def probe_image(candidate: ImageCandidate, timeout: float = PROBE_TIMEOUT) -> ImageCandidate | None:
+    """Fetch the first PROBE_BYTES (Range request) for type, size and dimensions; None if unusable."""
     try:
-        font = ImageFont.load_default()
+        with span("image_probe"):
+            with http_session().get(candidate.url, timeout=timeout, stream=True,
+                                    headers={"Range": f"bytes=0-{PROBE_BYTES - 1}"}) as resp:
+                resp.raise_for_status()
+                content_type = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                total = resp.headers.get("Content-Range", "").rpartition("/")[2]
+                length = int(total) if total.isdigit() else None
+                if length is None and resp.status_code == 200 and resp.headers.get("Content-Length"):
+                    length = int(resp.headers["Content-Length"])
+                head = b""
+                for chunk in resp.iter_content(DOWNLOAD_CHUNK):
+                    head += chunk
+                    if len(head) >= PROBE_BYTES:
+                        break
+        if content_type and not content_type.startswith("image/"):
+            return None
+        if length is not None and length > MAX_IMAGE_BYTES:
+            return None
+        width, height = candidate.width, candidate.height
+        try:
+            width, height = Image.open(io.BytesIO(head[:PROBE_BYTES])).size
+        except Exception:
+            pass  # header didn't fit in the probe; keep what the source told us
+        return ImageCandidate(candidate.url, width, height, length, content_type or None)
     except Exception:
-        font = None
-    margin = 60
-    max_width = size[0] - 2*margin
-
-    wrapped = []
-    line = ""
-    for word in text.split():
-        test = (line + " " + word).strip()
-        bbox = draw.textbbox((0,0), test, font=font)
-        w = bbox[2] - bbox[0]
-        if w <= max_width:
-            line = test
-        else:
-            if line:
-                wrapped.append(line)
-            line = word
-    if line:
-        wrapped.append(line)
-
-    y = size[1]//3
-    for ln in wrapped:
-        bbox = draw.textbbox((0,0), ln, font=font)
-        w = bbox[2] - bbox[0]
-        h = bbox[3] - bbox[1]
-        x = (size[0]-w)//2
-        draw.text((x,y), ln, fill=(30,45,40), font=font)
-        y += h + 10
-
-    footer = "Health & Longevity Daily"
-    bbox = draw.textbbox((0,0), footer, font=font)
-    fw = bbox[2] - bbox[0]
-    fh = bbox[3] - bbox[1]
-    draw.text((size[0]-fw-16, size[1]-fh-12), footer, fill=(80,100,95), font=font)
-
-    img.save(path, format="JPEG", quality=88)
+        return None
+
+def _preference(c: ImageCandidate, target_side: int):
+    # Smallest image that is big enough, then images of unknown size, then the biggest of the small ones
+    if c.side is None:
+        return (1, -(c.length or 0))
+    if c.side >= target_side:
+        return (0, c.width * c.height, c.length or 0)
+    return (2, -c.width * c.height)
+
+def resolve_image(candidates: list[ImageCandidate], accept=None, target_side: int = TARGET_IMAGE_SIDE,
+                  deadline: float = IMAGE_DEADLINE) -> tuple[str, bytes] | None:
+    """Probe every candidate at once, then download the best one that `accept(url, data)` takes.
+
+    Each probe and download is bounded by what is left of `deadline`, so a dead host costs at most
+    one probe timeout, in parallel with the others, instead of a full download timeout each.
+    """
+    if not candidates:
+        return None
+    start = time.monotonic()
+    remaining = lambda: deadline - (time.monotonic() - start)
+    seen, unique = set(), []
+    for c in candidates:
+        if c.url and c.url not in seen:
+            seen.add(c.url)
+            unique.append(c)
+
+    pool = ThreadPoolExecutor(max_workers=min(len(unique), 8), thread_name_prefix="image-probe")
+    probed = []
+    try:
+        futures = [submit(pool, probe_image, c, min(PROBE_TIMEOUT, remaining())) for c in unique]
+        for future in as_completed(futures, timeout=max(remaining(), 0)):
+            if future.result():
+                probed.append(future.result())
+    except FutureTimeout:
+        pass  # go with whatever answered in time
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    for c in sorted(probed, key=lambda c: _preference(c, target_side)):
+        if remaining() <= 0:
+            break
+        data = download_image(c.url, timeout=remaining())
+        if data is not None and (accept is None or accept(c.url, data)):
+            return c.url, data
+    return None
+
+class CardRenderer:
+    """Text card renderer that keeps its font, background and glyph widths between calls."""
+
+    def __init__(self, size=(1200,675), font=None, footer="Health & Longevity Daily",
+                 background=(240,247,245), text_color=(30,45,40), footer_color=(80,100,95), margin=60):
+        self.size = size
+        self.margin = margin
+        self.text_color = text_color
+        if font is None:
+            try:
+                font = ImageFont.load_default()
+            except Exception:
+                font = None
+        self.font = font
+        self._glyphs = {}
+        self._draw_probe = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+        top, bottom = self._draw_probe.textbbox((0,0), "Ag", font=font)[1::2]
+        self.line_height = bottom - top
+
+        # Background and footer never change, so they are drawn once and copied per card
+        self._template = Image.new("RGB", size, color=background)
+        if footer:
+            draw = ImageDraw.Draw(self._template)
+            bbox = draw.textbbox((0,0), footer, font=font)
+            fw = bbox[2] - bbox[0]
+            fh = bbox[3] - bbox[1]
+            draw.text((size[0]-fw-16, size[1]-fh-12), footer, fill=footer_color, font=font)
+
+    def _glyph_width(self, ch: str) -> float:
+        w = self._glyphs.get(ch)
+        if w is None:
+            w = self._glyphs[ch] = self._draw_probe.textlength(ch, font=self.font)
+        return w
+
+    def text_width(self, text: str) -> float:
+        return sum(self._glyph_width(ch) for ch in text)
+
+    def wrap(self, text: str) -> list[tuple[str, float]]:
+        # Greedy wrap in one pass: each word is measured once, line widths are running sums
+        max_width = self.size[0] - 2*self.margin
+        space = self._glyph_width(" ")
+        lines = []
+        words, width = [], 0.0
+        for word in text.split():
+            ww = self.text_width(word)
+            if words and width + space + ww > max_width:
+                lines.append((" ".join(words), width))
+                words, width = [], 0.0
+            width = width + space + ww if words else ww
+            words.append(word)
+        if words:
+            lines.append((" ".join(words), width))
+        return lines
+
+    def render(self, text: str) -> Image.Image:
+        img = self._template.copy()
+        draw = ImageDraw.Draw(img)
+        y = self.size[1]//3
+        for line, width in self.wrap(text):
+            draw.text(((self.size[0]-int(width))//2, y), line, fill=self.text_color, font=self.font)
+            y += self.line_height + 10
+        return img
+
+    def encode(self, text: str, quality: int = 88) -> bytes:
+        buf = io.BytesIO()
+        self.render(text).save(buf, format="JPEG", quality=quality)
+        return buf.getvalue()
+
+_renderers = {}
+
+def get_card_renderer(size=(1200,675)) -> CardRenderer:
+    size = tuple(size)
+    if size not in _renderers:
+        _renderers[size] = CardRenderer(size)
+    return _renderers[size]
+
+def render_fallback_image(text: str, size=(1200,675)) -> bytes:
+    return get_card_renderer(size).encode(text)
+
+def _decode(img: Image.Image, max_side: int) -> Image.Image:
+    if img.format == "JPEG":
+        # Let libjpeg scale down by 1/2, 1/4 or 1/8 while decoding instead of decoding full size
+        scale = min(1.0, max_side / max(img.size))
+        img.draft("RGB", (int(img.width * scale), int(img.height * scale)))
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+def _crop_to_aspect(img: Image.Image, aspect) -> Image.Image:
+    if not aspect:
+        return img
+    w, h = img.size
+    ratio = w / h
+    if ratio < aspect[0]:
+        new_h = round(w / aspect[0])
+        top = (h - new_h) // 2
+        return img.crop((0, top, w, top + new_h))
+    if ratio > aspect[1]:
+        new_w = round(h * aspect[1])
+        left = (w - new_w) // 2
+        return img.crop((left, 0, left + new_w, h))
+    return img
+
+def _encode_within(img: Image.Image, max_side: int, max_bytes: int) -> bytes:
+    if max(img.size) > max_side:
+        img = img.copy()
+        img.thumbnail((max_side, max_side), Image.LANCZOS)
+    while True:
+        for quality in (88, 80, 70, 60):
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=quality, optimize=True)
+            if buf.tell() <= max_bytes:
+                return buf.getvalue()
+        img = img.resize((int(img.width * 0.85), int(img.height * 0.85)), Image.LANCZOS)
+
+def _load_cached(paths: dict[str, str]) -> dict[str, bytes] | None:
+    shared = {}  # identical variants come back as one buffer
+    try:
+        out = {}
+        for key, path in paths.items():
+            with open(path, "rb") as f:
+                data = f.read()
+            out[key] = shared.setdefault(data, data)
+        return out
+    except OSError:
+        return None
+
+def dhash(data: bytes) -> int:
+    """64-bit difference hash: survives re-encoding, resizing and small edits, unlike a content hash."""
+    img = Image.open(io.BytesIO(data))
+    img.draft("L", (64, 64))  # JPEGs decode at 1/8 scale; the hash only needs 9x8 pixels
+    px = np.asarray(img.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = np.packbits(px[:, 1:] > px[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+def _variant_paths(digest: str, platforms=None) -> dict[str, str]:
+    out_dir = os.path.join(VARIANT_DIR, digest[:2], digest)
+    return {key: os.path.join(out_dir, f"{key}.jpg") for key in platforms or PLATFORM_IMAGE_LIMITS}
+
+def cached_variants(digest: str, platforms=None) -> dict[str, bytes] | None:
+    """Variants already built for the image with this content hash, without needing the image itself."""
+    paths = _variant_paths(digest, platforms)
+    if all(os.path.exists(p) for p in paths.values()):
+        cached = _load_cached(paths)
+        if cached is not None:
+            _touch(os.path.dirname(next(iter(paths.values()))))
+        return cached
+    return None
+
+def _touch(path: str):
+    try:
+        os.utime(path)  # the directory's mtime is its last use, for _evict_variants
+    except OSError:
+        pass
+
+_evict_lock = threading.Lock()
+
+def _evict_variants(keep: str):
+    # Drop the least recently used images' variants until the cache fits VARIANT_CACHE_BYTES
+    with _evict_lock:
+        entries, total = [], 0
+        for shard in os.scandir(VARIANT_DIR):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, entry.path, size))
+                except OSError:
+                    continue
+                total += size
+        for _, path, size in sorted(entries):
+            if total <= VARIANT_CACHE_BYTES:
+                break
+            if path != keep:
+                shutil.rmtree(path, ignore_errors=True)
+                total -= size
+
+def build_variants(data: bytes, digest: str | None = None, platforms=None) -> dict[str, bytes]:
+    """Decode the image once and return upload-ready JPEG bytes per platform, cached on disk by content hash.
+
+    Only `platforms` (keys of PLATFORM_IMAGE_LIMITS, default all) are built. Platforms whose variant
+    is identical get the same bytes object, often the downloaded buffer itself.
+    """
+    digest = digest or sha256(data).hexdigest()
+    cached = cached_variants(digest, platforms)
+    if cached is not None:
+        return cached
+    paths = _variant_paths(digest, platforms)
+    out_dir = os.path.dirname(paths[next(iter(paths))])
+
+    img = Image.open(io.BytesIO(data))
+    width, height = img.size
+    # An upright JPEG that already fits a platform is uploaded as-is rather than re-encoded
+    upright_jpeg = img.format == "JPEG" and img.getexif().get(0x0112, 1) == 1
+    decoded = None
+    os.makedirs(out_dir, exist_ok=True)
+    encoded = {}  # platforms with identical limits share one encode
+    variants = {}
+    for key in paths:
+        limits = PLATFORM_IMAGE_LIMITS[key]
+        spec = (limits["aspect"], limits["max_side"], limits["max_bytes"])
+        aspect = limits["aspect"]
+        if (upright_jpeg and len(data) <= limits["max_bytes"] and max(width, height) <= limits["max_side"]
+                and (not aspect or aspect[0] <= width / height <= aspect[1])):
+            encoded[spec] = data
+        elif spec not in encoded:
+            if decoded is None:
+                decoded = _decode(img, max(PLATFORM_IMAGE_LIMITS[k]["max_side"] for k in paths))
+            encoded[spec] = _encode_within(_crop_to_aspect(decoded, aspect), limits["max_side"], limits["max_bytes"])
+        variants[key] = encoded[spec]
+        tmp = paths[key] + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(encoded[spec])
+        os.replace(tmp, paths[key])
+    _evict_variants(out_dir)
+    return variants
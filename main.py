@@ -2,32 +2,65 @@
 import os
 import sys
 from datetime import datetime
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 import pytz
 from dotenv import load_dotenv
 
 # Load local .env if present
 load_dotenv()
 
-from bot import run_once
+from bot import run_once, prepare, resume
+from channels import load_channels, run_in_channel
+import metrics
 
-TIMEZONE = os.getenv("TIMEZONE", "Australia/Brisbane")
-POST_TIME = os.getenv("POST_TIME", "09:00")  # HH:MM 24h
+PREPARE_INTERVAL_HOURS = float(os.getenv("PREPARE_INTERVAL_HOURS", "6"))
+RETRY_INTERVAL_MINUTES = float(os.getenv("RETRY_INTERVAL_MINUTES", "30"))  # how often failed platforms are retried
+SCHEDULER_WORKERS = int(os.getenv("SCHEDULER_WORKERS", "4"))  # channels processed at the same time
+METRICS_PORT = os.getenv("METRICS_PORT")  # serve Prometheus metrics from the scheduler process
 
-def schedule_job():
-    tz = pytz.timezone(TIMEZONE)
-    hour, minute = map(int, POST_TIME.split(":"))
-    sched = BlockingScheduler(timezone=tz)
-    sched.add_job(run_once, CronTrigger(hour=hour, minute=minute, timezone=tz))
-    print(f"[Scheduler] Will post daily at {POST_TIME} ({TIMEZONE}).", flush=True)
+def schedule_job(channels=None):
+    channels = channels or load_channels()
+    sched = BlockingScheduler(executors={"default": ThreadPoolExecutor(SCHEDULER_WORKERS)})
+    for channel in channels:
+        tz = pytz.timezone(channel.timezone)
+        for post_time in channel.post_times:
+            hour, minute = map(int, post_time.split(":"))
+            sched.add_job(run_in_channel, CronTrigger(hour=hour, minute=minute, timezone=tz),
+                          args=(channel, run_once), id=f"{channel.name}:post:{post_time}",
+                          misfire_grace_time=3600, coalesce=True)
+        # Fill the queue ahead of time (and once at startup) so the cron job only publishes
+        sched.add_job(run_in_channel, IntervalTrigger(hours=PREPARE_INTERVAL_HOURS, timezone=tz),
+                      args=(channel, prepare), id=f"{channel.name}:prepare",
+                      next_run_time=datetime.now(tz), max_instances=1, coalesce=True)
+        # Redo only the platforms a previous publish missed (also picks up posts cut short by a crash)
+        sched.add_job(run_in_channel, IntervalTrigger(minutes=RETRY_INTERVAL_MINUTES, timezone=tz),
+                      args=(channel, resume), id=f"{channel.name}:resume", max_instances=1, coalesce=True)
+        print(f"[Scheduler] {channel.name}: will post daily at {', '.join(channel.post_times)} ({channel.timezone}).", flush=True)
+    print(f"[Scheduler] {len(channels)} channel(s), preparing posts every {PREPARE_INTERVAL_HOURS:g}h "
+          f"with {SCHEDULER_WORKERS} workers.", flush=True)
+    if METRICS_PORT:
+        metrics.serve(int(METRICS_PORT))
+        print(f"[Scheduler] Serving metrics on :{METRICS_PORT}/metrics", flush=True)
     try:
         sched.start()
     except (KeyboardInterrupt, SystemExit):
         print("[Scheduler] Stopped.")
 
 if __name__ == "__main__":
+    if "--profile" in sys.argv[1:]:
+        # Same as PROFILE=<mode>: cProfile/tracemalloc every run into PROFILE_DIR (see profiling.py)
+        args = sys.argv[1:]
+        i = args.index("--profile")
+        os.environ["PROFILE"] = args[i + 1] if i + 1 < len(args) else "all"
+    if os.getenv("RESUME_NOW"):
+        for channel in load_channels():
+            run_in_channel(channel, resume)
+        sys.exit(0)
     if os.getenv("RUN_NOW"):
-        run_once()
+        for channel in load_channels():
+            run_in_channel(channel, run_once)
         sys.exit(0)
-    schedule_job()
\ No newline at end of file
+    schedule_job()
@@ -0,0 +1,165 @@
+# metrics.py - timing spans, counters and histograms for each run
+#
+# Every finished run appends one JSON line (with all its spans) to METRICS_DIR/runs.jsonl and
+# rewrites METRICS_DIR/metrics.prom in Prometheus text format. Set METRICS_PORT to also serve
+# the same text at http://<host>:<port>/metrics from the scheduler process.
+
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, ExitStack
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from channels import current_channel
+
+METRICS_DIR = os.getenv("METRICS_DIR", "metrics")
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_export_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+_run = contextvars.ContextVar("metrics_run", default=None)
+_span_hooks = []  # hook(stage, labels) -> context manager entered around every span (see profiling.py)
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    labels.setdefault("channel", current_channel().name)
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, **labels):
+    labels.setdefault("channel", current_channel().name)
+    with _lock:
+        h = _histograms.setdefault(_key(name, labels), [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                h[i] += 1
+        h[len(BUCKETS)] += 1
+        h[-1] += value
+
+def add_bytes(kind: str, n: int, **labels):
+    inc("curator_bytes_total", n, kind=kind, **labels)
+    run = _run.get()
+    if run is not None:
+        with _lock:
+            run["bytes"][kind] = run["bytes"].get(kind, 0) + n
+
+def add_span_hook(hook):
+    _span_hooks.append(hook)
+
+def current_run() -> dict | None:
+    return _run.get()
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time a pipeline stage; records latency, a success/failure count and the span on the current run."""
+    with ExitStack() as hooks:
+        for hook in _span_hooks:
+            hooks.enter_context(hook(stage, labels))
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            yield
+        except BaseException:
+            outcome = "failure"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            observe("curator_stage_seconds", elapsed, stage=stage, **labels)
+            inc("curator_stage_total", stage=stage, outcome=outcome, **labels)
+            run = _run.get()
+            if run is not None:
+                with _lock:
+                    run["spans"].append({"stage": stage, **labels, "seconds": round(elapsed, 4), "outcome": outcome})
+
+@contextmanager
+def run(kind: str):
+    """Collect the spans of one run (prepare or publish) and export them when it finishes."""
+    record = {"kind": kind, "channel": current_channel().name,
+              "started": datetime.now(timezone.utc).isoformat(), "spans": [], "bytes": {}}
+    token = _run.set(record)
+    try:
+        with span(kind):
+            yield record
+    finally:
+        _run.reset(token)
+        record["seconds"] = next((s["seconds"] for s in reversed(record["spans"]) if s["stage"] == kind), None)
+        export(record)
+
+def set_outcome(key: str, value):
+    # Attach a run-level fact (e.g. platforms posted) to the current run record
+    record = _run.get()
+    if record is not None:
+        record[key] = value
+
+def prometheus_text() -> str:
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_fmt(labels)} {value:g}")
+    for (name, labels), h in histograms:
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        for bound, count in zip(BUCKETS, h):
+            lines.append(f"{name}_bucket{_fmt(labels + (('le', f'{bound:g}'),))} {count}")
+        lines.append(f"{name}_bucket{_fmt(labels + (('le', '+Inf'),))} {h[len(BUCKETS)]}")
+        lines.append(f"{name}_sum{_fmt(labels)} {h[-1]:.6f}")
+        lines.append(f"{name}_count{_fmt(labels)} {h[len(BUCKETS)]}")
+    return "\n".join(lines) + "\n"
+
+def _escape(value) -> str:
+    # Label values in the text format escape backslash, double quote and line feed
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _fmt(labels) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return "{" + body + "}"
+
+def export(record: dict):
+    text = prometheus_text()
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        with _export_lock:
+            with open(os.path.join(METRICS_DIR, "runs.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+            tmp = os.path.join(METRICS_DIR, "metrics.prom.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, os.path.join(METRICS_DIR, "metrics.prom"))
+    except OSError as e:
+        print("[Metrics][WARN] Could not write metrics:", e)
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+def serve(port: int) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("", port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
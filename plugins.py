@@ -0,0 +1,38 @@
+# plugins.py - registry entries for content sources and publishing platforms
+#
+# A plugin names its code as "module:function" and is only imported the first time it is used,
+# so a run never pays for client libraries (tweepy, atproto, praw) it doesn't need. A plugin is
+# active for a channel when it is enabled (see enabled()) and all of its required settings are set.
+
+import importlib
+import os
+import threading
+from dataclasses import dataclass
+from channels import current_channel
+
+_lock = threading.Lock()
+_loaded = {}  # target -> callable
+
+@dataclass(frozen=True)
+class Plugin:
+    key: str
+    name: str
+    target: str  # "module:function"
+    requires: tuple[str, ...] = ()  # settings the current channel must have
+
+    def configured(self) -> bool:
+        channel = current_channel()
+        return all(channel.setting(name) for name in self.requires)
+
+    def load(self):
+        with _lock:
+            if self.target not in _loaded:
+                module, _, attr = self.target.partition(":")
+                _loaded[self.target] = getattr(importlib.import_module(module), attr)
+            return _loaded[self.target]
+
+def enabled(registry: list[Plugin], env_var: str) -> list[Plugin]:
+    """Plugins named in the comma-separated setting (all if unset) that are configured for the current channel."""
+    raw = current_channel().setting(env_var, os.getenv(env_var, ""))
+    keys = {k.strip() for k in (raw or "").split(",") if k.strip()}
+    return [p for p in registry if (not keys or p.key in keys) and p.configured()]
@@ -2,133 +2,133 @@
 
 # This file includes full API posting functions for Twitter/X, Instagram, Facebook, and Bluesky.
 # Ensure environment variables are set and required packages are installed (tweepy, requests, atproto).
+# Clients and HTTP connections are created once and reused, see clients.py.
+# Each function gets the upload-ready JPEG as bytes and sends that buffer as-is; nothing touches disk.
+# Each returns the platform's ID for the new post, which publishing.py records in the publish journal.
+# Every API call goes through ratelimit.call; publishing steps are only retried when the server refused them (429).
 # For testing without posting, set DRY_RUN=true in your environment variables.
 
+import io
 import os
-import requests
-from atproto import Client as BlueskyClient
+from clients import http_session, twitter_clients, bluesky_client, reset_client
+from channels import setting
+from ratelimit import call
+from publishing import saved_state, checkpoint, platform_deadline
 
 DRY_RUN = os.getenv("DRY_RUN", "false").lower() == "true"
+GRAPH_API_BASE = os.getenv("GRAPH_API_BASE", "https://graph.facebook.com")
 
-# --- Twitter/X ---
-import tweepy
+def _graph_post(platform: str, url: str, **kwargs):
+    # Tokens go in the form body (data=), never the URL: HTTPError messages include the URL.
+    # The socket timeout turns a hung upload into a failure that resume() retries.
+    r = http_session().post(url, timeout=platform_deadline(platform), **kwargs)
+    r.raise_for_status()
+    return r
 
-def post_to_twitter(caption: str, image_path: str):
+# --- Twitter/X ---
+def post_to_twitter(caption: str, image: bytes):
     if DRY_RUN:
         print(f"[Dry Run] Would post to Twitter/X with caption: {caption}")
         return
     try:
-        # Initialize both v1.1 (for media) and v2 (for posting)
-        auth = tweepy.OAuth1UserHandler(
-            os.getenv("TWITTER_API_KEY"),
-            os.getenv("TWITTER_API_SECRET"),
-            os.getenv("TWITTER_ACCESS_TOKEN"),
-            os.getenv("TWITTER_ACCESS_SECRET")
-        )
-        api_v1 = tweepy.API(auth)
-        
+        # Cached v1.1 (for media) and v2 (for posting) clients
+        api_v1, client = twitter_clients()
+
         # Upload media using v1.1
-        media = api_v1.media_upload(filename=image_path)
-        
-        # Post using v2
-        client = tweepy.Client(
-            consumer_key=os.getenv("TWITTER_API_KEY"),
-            consumer_secret=os.getenv("TWITTER_API_SECRET"),
-            access_token=os.getenv("TWITTER_ACCESS_TOKEN"),
-            access_token_secret=os.getenv("TWITTER_ACCESS_SECRET")
-        )
-        
-        client.create_tweet(text=caption, media_ids=[media.media_id])
+        # A fresh BytesIO per attempt (retries must start at offset 0); it shares the bytes rather than copying them
+        media = call("twitter", lambda: api_v1.media_upload(filename="image.jpg", file=io.BytesIO(image)))
+
+        response = call("twitter", client.create_tweet, text=caption, media_ids=[media.media_id], idempotent=False)
         print("[Twitter/X] Posted successfully.")
+        return str(response.data["id"])
     except Exception as e:
         print("[Twitter/X][ERROR]", e)
+        raise
 
 
 # --- Instagram ---
-def post_to_instagram(caption: str, image_path: str):
+def post_to_instagram(caption: str, image: bytes):
     if DRY_RUN:
         print(f"[Dry Run] Would post to Instagram with caption: {caption}")
         return
     try:
-        access_token = os.getenv("INSTAGRAM_ACCESS_TOKEN")
-        ig_user_id = os.getenv("INSTAGRAM_ACCOUNT_ID")
+        access_token = setting("INSTAGRAM_ACCESS_TOKEN")
+        ig_user_id = setting("INSTAGRAM_ACCOUNT_ID")
         if not access_token or not ig_user_id:
             raise ValueError("Instagram credentials not set in environment variables.")
 
-        image_upload_url = f"https://graph.facebook.com/v19.0/{ig_user_id}/media"
-        with open(image_path, "rb") as f:
-            image_data = f.read()
-        files = {"source": image_data}
-        params = {"caption": caption, "access_token": access_token}
-        r = requests.post(image_upload_url, params=params, files=files)
-        r.raise_for_status()
-        creation_id = r.json()["id"]
-
-        publish_url = f"https://graph.facebook.com/v19.0/{ig_user_id}/media_publish"
-        publish_params = {"creation_id": creation_id, "access_token": access_token}
-        requests.post(publish_url, params=publish_params)
+        # A container made by an earlier, failed attempt is published instead of uploading again
+        creation_id = saved_state("creation_id")
+        if not creation_id:
+            image_upload_url = f"{GRAPH_API_BASE}/v19.0/{ig_user_id}/media"
+            files = {"source": image}
+            data = {"caption": caption, "access_token": access_token}
+            r = call("instagram", _graph_post, "instagram", image_upload_url, data=data, files=files)
+            creation_id = r.json()["id"]
+            checkpoint(creation_id=creation_id)
+
+        publish_url = f"{GRAPH_API_BASE}/v19.0/{ig_user_id}/media_publish"
+        publish_data = {"creation_id": creation_id, "access_token": access_token}
+        r = call("instagram", _graph_post, "instagram", publish_url, data=publish_data, idempotent=False)
         print("[Instagram] Posted successfully.")
+        return r.json().get("id")
     except Exception as e:
         print("[Instagram][ERROR]", e)
+        raise
 
 
 # --- Facebook ---
-def post_to_facebook(caption: str, image_path: str):
+def post_to_facebook(caption: str, image: bytes):
     if DRY_RUN:
         print(f"[Dry Run] Would post to Facebook with caption: {caption}")
         return
     try:
-        page_access_token = os.getenv("FACEBOOK_PAGE_ACCESS_TOKEN") 
-        page_id = os.getenv("FACEBOOK_PAGE_ID")
+        page_access_token = setting("FACEBOOK_PAGE_ACCESS_TOKEN")
+        page_id = setting("FACEBOOK_PAGE_ID")
         if not page_access_token or not page_id:
             raise ValueError("Facebook credentials not set in environment variables.")
 
-        url = f"https://graph.facebook.com/{page_id}/photos"
-        with open(image_path, "rb") as f:
-            files = {"source": f}
-            data = {"caption": caption, "access_token": page_access_token}
-            r = requests.post(url, files=files, data=data)
-        r.raise_for_status()
+        url = f"{GRAPH_API_BASE}/{page_id}/photos"
+        files = {"source": ("image.jpg", image)}
+        data = {"caption": caption, "access_token": page_access_token}
+        r = call("facebook", _graph_post, "facebook", url, files=files, data=data, idempotent=False)
         print("[Facebook] Posted successfully.")
+        body = r.json()
+        return body.get("post_id") or body.get("id")
     except Exception as e:
         print("[Facebook][ERROR]", e)
+        raise
 
 
 # --- Bluesky ---
-def post_to_bluesky(caption: str, image_path: str):
+def post_to_bluesky(caption: str, image: bytes):
     if DRY_RUN:
         print(f"[Dry Run] Would post to Bluesky with caption: {caption}")
         return
     try:
-        handle = os.getenv("BLUESKY_HANDLE")
-        password = os.getenv("BLUESKY_PASSWORD")
-        if not handle or not password:
-            raise ValueError("Bluesky credentials not set in environment variables.")
-
-        client = BlueskyClient()
-        client.login(handle, password)
-
-        with open(image_path, "rb") as f:
-            img_data = f.read()
-        blob = client.com.atproto.repo.upload_blob(img_data)
-
-        client.com.atproto.repo.create_record(
-            repo=client.me.did,
-            collection="app.bsky.feed.post",
-            record={
-                "$type": "app.bsky.feed.post",
-                "text": caption,
-                "embed": {
-                    "$type": "app.bsky.embed.images",
-                    "images": [
-                        {
-                            "alt": caption,
-                            "image": blob.blob,
-                        }
-                    ]
-                }
+        client = bluesky_client()
+
+        blob = call("bluesky", client.com.atproto.repo.upload_blob, image)
+
+        record = {
+            "$type": "app.bsky.feed.post",
+            "text": caption,
+            "createdAt": client.get_current_time_iso(),
+            "embed": {
+                "$type": "app.bsky.embed.images",
+                "images": [
+                    {
+                        "alt": caption,
+                        "image": blob.blob,
+                    }
+                ]
             }
-        )
+        }
+        created = call("bluesky", client.com.atproto.repo.create_record,
+                       {"repo": client.me.did, "collection": "app.bsky.feed.post", "record": record}, idempotent=False)
         print("[Bluesky] Posted successfully.")
+        return created.uri
     except Exception as e:
         print("[Bluesky][ERROR]", e)
+        reset_client("bluesky")
+        raise
@@ -0,0 +1,236 @@
+# profiling.py - opt-in cProfile / tracemalloc capture of whole runs, without code changes
+#
+# PROFILE=cpu, PROFILE=memory or PROFILE=all (or `python main.py --profile all`) profiles every
+# prepare/publish/resume run. Per run it writes to PROFILE_DIR:
+#   <channel>-<kind>-<timestamp>.prof      cProfile stats, including stages run in worker threads
+#   <channel>-<kind>-<timestamp>.mem.txt   top allocations over the run and memory per stage
+# Only the newest PROFILE_KEEP runs of each channel/kind are kept.
+#
+#   python -m profiling summary [--kind publish] [--last 10]   one line per run: profiled seconds (summed
+#                                                              over threads) and where most of it was spent
+#   python -m profiling diff [OLD.prof NEW.prof]               what got slower (default: last two runs)
+
+import argparse
+import contextvars
+import cProfile
+import glob
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import metrics
+from channels import current_channel
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+PROFILE_TRACE_FRAMES = int(os.getenv("PROFILE_TRACE_FRAMES", "1"))  # deeper stacks make memory mode much slower
+TOP_ALLOCATIONS = 25
+
+_session = contextvars.ContextVar("profile_session", default=None)
+_local = threading.local()  # cProfile allows one active profiler per thread
+_tracing_lock = threading.Lock()
+_tracing_users = 0  # tracemalloc is process-wide; concurrent channel runs share it
+_started_tracing = False  # only stop tracing we started (bench/e2e.py traces on its own)
+
+def profile_mode() -> set[str]:
+    # Read on every run so main.py --profile (or a changed env) takes effect without a re-import
+    mode = os.getenv("PROFILE", "").lower()
+    if mode in ("1", "true", "all"):
+        return {"cpu", "memory"}
+    return {m.strip() for m in mode.split(",") if m.strip() in ("cpu", "memory")}
+
+class Session:
+    def __init__(self, kind: str, modes: set[str]):
+        self.kind = kind
+        self.cpu = "cpu" in modes
+        self.memory = "memory" in modes
+        self.thread = threading.get_ident()
+        self.profilers = []  # one per thread that ran a stage
+        self.stages = []  # (stage, labels, seconds, memory delta, peak so far)
+        self._lock = threading.Lock()
+        self._baseline = None
+
+    def start(self):
+        global _tracing_users, _started_tracing
+        if self.memory:
+            with _tracing_lock:
+                if _tracing_users == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start(PROFILE_TRACE_FRAMES)
+                    _started_tracing = True
+                _tracing_users += 1
+            self._baseline = tracemalloc.take_snapshot()
+        if self.cpu:
+            self._enable_here()
+
+    def _enable_here(self) -> bool:
+        if getattr(_local, "profiler", None) is not None:
+            return False
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return False  # another profiler (e.g. a debugger) owns this thread
+        _local.profiler = profiler
+        with self._lock:
+            self.profilers.append(profiler)
+        return True
+
+    @staticmethod
+    def _disable_here():
+        _local.profiler.disable()
+        _local.profiler = None
+
+    @contextmanager
+    def stage(self, stage: str, labels: dict):
+        # Worker threads (sources, uploads, image probes) get their own profiler, merged at the end
+        profiled = self.cpu and threading.get_ident() != self.thread and self._enable_here()
+        before = tracemalloc.get_traced_memory()[0] if self.memory else 0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if profiled:
+                self._disable_here()
+            current, peak = tracemalloc.get_traced_memory() if self.memory else (0, 0)
+            with self._lock:
+                self.stages.append((stage, labels, time.perf_counter() - start, current - before, peak))
+
+    def finish(self):
+        global _tracing_users, _started_tracing
+        if self.cpu and getattr(_local, "profiler", None) is not None:
+            self._disable_here()
+        stem = os.path.join(PROFILE_DIR, f"{current_channel().name}-{self.kind}-"
+                                         f"{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ')}")
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if self.memory:
+                self._write_memory_report(stem + ".mem.txt")
+            if self.cpu and self.profilers:
+                stats = pstats.Stats(self.profilers[0])
+                for profiler in self.profilers[1:]:
+                    stats.add(profiler)
+                stats.dump_stats(stem + ".prof")
+            _rotate(f"{current_channel().name}-{self.kind}-")
+        except OSError as e:
+            print("[Profile][WARN] Could not write profile:", e)
+        finally:
+            if self.memory:
+                with _tracing_lock:
+                    _tracing_users -= 1
+                    if _tracing_users == 0 and _started_tracing:
+                        tracemalloc.stop()
+                        _started_tracing = False
+
+    def _write_memory_report(self, path: str):
+        # The profiler's own bookkeeping isn't what we're looking for
+        ignore = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, pstats, tracemalloc)]
+        snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"{self.kind} run - current {current / 2**20:.1f} MiB, peak {peak / 2**20:.1f} MiB", "",
+                 "Per stage (memory delta, peak so far):"]
+        for stage, labels, seconds, delta, stage_peak in self.stages:
+            label = ",".join(f"{k}={v}" for k, v in labels.items())
+            lines.append(f"  {stage:<16} {label:<24} {seconds:8.3f}s {delta / 1024:+10.0f} KiB  peak {stage_peak / 2**20:7.1f} MiB")
+        lines += ["", f"Top {TOP_ALLOCATIONS} allocations since the run started:"]
+        group = "traceback" if PROFILE_TRACE_FRAMES > 1 else "lineno"
+        for stat in snapshot.compare_to(self._baseline.filter_traces(ignore), group)[:TOP_ALLOCATIONS]:
+            lines.append(f"  {stat}")
+            if group == "traceback":
+                lines += [f"    {line}" for line in stat.traceback.format(most_recent_first=True)]
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+def _rotate(prefix: str):
+    runs = sorted({os.path.basename(path).split(".")[0] for path in glob.glob(os.path.join(PROFILE_DIR, prefix + "*"))})
+    for stem in runs[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        for path in glob.glob(os.path.join(PROFILE_DIR, stem + ".*")):
+            os.remove(path)
+
+@contextmanager
+def _span_hook(stage: str, labels: dict):
+    session = _session.get()
+    if session is not None:
+        with session.stage(stage, labels):
+            yield
+        return
+    run = metrics.current_run()
+    modes = profile_mode() if run is not None and stage == run["kind"] else None
+    if not modes:
+        yield
+        return
+    # The run's own span: profile everything until it ends
+    session = Session(stage, modes)
+    token = _session.set(session)
+    session.start()
+    try:
+        yield
+    finally:
+        _session.reset(token)
+        session.finish()
+
+metrics.add_span_hook(_span_hook)
+
+# --- summary / diff ---
+
+def _profiles(kind: str | None = None, channel: str | None = None) -> list[str]:
+    paths = sorted(glob.glob(os.path.join(PROFILE_DIR, "*.prof")), key=lambda p: os.path.basename(p).rsplit("-", 1)[-1])
+    def matches(path):
+        name, run_kind = os.path.basename(path).rsplit("-", 2)[:2]
+        return (kind is None or run_kind == kind) and (channel is None or name == channel)
+    return [p for p in paths if matches(p)]
+
+def _functions(path: str, own: bool = False) -> tuple[float, dict]:
+    stats = pstats.Stats(path)
+    # (file, line, name) -> cumulative seconds, or seconds spent in the function itself
+    return stats.total_tt, {func: row[2] if own else row[3] for func, row in stats.stats.items()}
+
+def _label(func) -> str:
+    filename, line, name = func
+    return f"{os.path.basename(filename)}:{line}({name})" if line else name
+
+def summary(kind: str | None = None, last: int = 10, top: int = 3):
+    for path in _profiles(kind)[-last:]:
+        total, funcs = _functions(path, own=True)
+        slow = ", ".join(f"{_label(f)} {t:.2f}s" for t, f in sorted(((t, f) for f, t in funcs.items()), reverse=True)[:top])
+        print(f"{os.path.basename(path):<52} {total:8.3f}s  {slow}")
+
+def diff(old: str, new: str, top: int = 20):
+    old_total, old_funcs = _functions(old)
+    new_total, new_funcs = _functions(new)
+    print(f"{os.path.basename(old)} -> {os.path.basename(new)}: {old_total:.3f}s -> {new_total:.3f}s "
+          f"({new_total - old_total:+.3f}s)")
+    deltas = sorted(((new_funcs.get(f, 0.0) - old_funcs.get(f, 0.0), f) for f in set(old_funcs) | set(new_funcs)),
+                    key=lambda d: -abs(d[0]))
+    print(f"{'delta (s)':>10} {'old (s)':>9} {'new (s)':>9}  function (cumulative time)")
+    for delta, func in deltas[:top]:
+        print(f"{delta:>+10.3f} {old_funcs.get(func, 0.0):>9.3f} {new_funcs.get(func, 0.0):>9.3f}  {_label(func)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m profiling", description="Summarize and compare run profiles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    s = commands.add_parser("summary", help="one line per profiled run")
+    s.add_argument("--kind", choices=["prepare", "publish", "resume"])
+    s.add_argument("--last", type=int, default=10)
+    d = commands.add_parser("diff", help="per-function change between two runs (default: the last two)")
+    d.add_argument("profiles", nargs="*", metavar="PROF")
+    d.add_argument("--kind", choices=["prepare", "publish", "resume"], default="publish")
+    d.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "summary":
+        summary(args.kind, args.last)
+        return
+    if len(args.profiles) == 2:
+        old, new = args.profiles
+    else:
+        runs = _profiles(args.kind)
+        if len(runs) < 2:
+            parser.exit(1, f"Need two {args.kind} profiles in {PROFILE_DIR} (or pass two .prof files)\n")
+        old, new = runs[-2:]
+    diff(old, new, args.top)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# publishing.py - concurrent fan-out of one post to every platform
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from channels import submit
+from clients import redact
+from metrics import span, add_bytes
+from plugins import Plugin, enabled
+
+PUBLISH_TIMEOUT = float(os.getenv("PUBLISH_TIMEOUT", "90"))  # seconds, per platform
+
+# PUBLISH_TIMEOUT_<KEY> overrides the deadline per platform; PUBLISH_PLATFORMS limits which are used
+PLATFORMS = [
+    Plugin("twitter", "Twitter/X", "posting:post_to_twitter",
+           ("TWITTER_API_KEY", "TWITTER_API_SECRET", "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_SECRET")),
+    Plugin("instagram", "Instagram", "posting:post_to_instagram", ("INSTAGRAM_ACCESS_TOKEN", "INSTAGRAM_ACCOUNT_ID")),
+    Plugin("facebook", "Facebook", "posting:post_to_facebook", ("FACEBOOK_PAGE_ACCESS_TOKEN", "FACEBOOK_PAGE_ID")),
+    Plugin("bluesky", "Bluesky", "posting:post_to_bluesky", ("BLUESKY_HANDLE", "BLUESKY_PASSWORD")),
+]
+
+def enabled_platforms() -> list[Plugin]:
+    # Enabled and configured for the current channel; the rest are never imported
+    return enabled(PLATFORMS, "PUBLISH_PLATFORMS")
+
+@dataclass
+class PublishResult:
+    platform: str
+    success: bool
+    latency: float
+    error: str | None = None
+    remote_id: str | None = None  # the platform's ID for the new post
+
+_delivery = contextvars.ContextVar("delivery", default=None)
+
+def saved_state(name: str):
+    """An intermediate ID checkpointed by an earlier attempt of this delivery (see content_queue.Delivery)."""
+    delivery = _delivery.get()
+    return delivery.state.get(name) if delivery else None
+
+def checkpoint(**state):
+    delivery = _delivery.get()
+    if delivery:
+        delivery.checkpoint(**state)
+
+def platform_deadline(key: str) -> float:
+    return float(os.getenv(f"PUBLISH_TIMEOUT_{key.upper()}", PUBLISH_TIMEOUT))
+
+def _post_one(platform: Plugin, caption: str, image: bytes, delivery=None) -> PublishResult:
+    start = time.perf_counter()
+    _delivery.set(delivery)
+    try:
+        if delivery:
+            delivery.begin()
+        with span("upload", platform=platform.key):
+            remote_id = platform.load()(caption, image)
+        add_bytes("upload", len(image), platform=platform.key)
+        if delivery:
+            delivery.finish(True, remote_id)
+        return PublishResult(platform.name, True, time.perf_counter() - start, remote_id=remote_id)
+    except Exception as e:
+        error = redact(e) or type(e).__name__  # journaled in queue.db and logged
+        if delivery:
+            delivery.finish(False, error=error)
+        return PublishResult(platform.name, False, time.perf_counter() - start, error)
+
+def publish_all(caption: str, images: dict[str, bytes] | bytes, platforms: list[Plugin] | None = None,
+                deliveries: dict | None = None) -> list[PublishResult]:
+    # images maps platform key -> upload-ready bytes (see imaging.build_variants), or one image for all;
+    # every uploader reads the same buffers, nothing is copied or written to disk.
+    # deliveries (platform key -> content_queue.Delivery) journals each platform's progress.
+    platforms = enabled_platforms() if platforms is None else platforms
+    if not platforms:
+        return []
+    pool = ThreadPoolExecutor(max_workers=len(platforms), thread_name_prefix="publish")
+    start = time.perf_counter()
+    futures = [
+        (platform, submit(pool, _post_one, platform, caption,
+                          images if isinstance(images, bytes) else images[platform.key],
+                          (deliveries or {}).get(platform.key)))
+        for platform in platforms
+    ]
+    results = []
+    try:
+        for platform, future in futures:
+            remaining = platform_deadline(platform.key) - (time.perf_counter() - start)
+            try:
+                results.append(future.result(timeout=max(remaining, 0)))
+            except FutureTimeout:
+                # A running upload can't be interrupted; we stop waiting and drop its result.
+                future.cancel()
+                results.append(PublishResult(platform.name, False, time.perf_counter() - start,
+                                             f"deadline of {platform_deadline(platform.key):g}s exceeded"))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
@@ -0,0 +1,155 @@
+# ranking.py - score a whole batch of candidates at once and pick the best instead of a random one
+#
+# Each candidate gets four features, all scaled to 0..1:
+#   relevance  - TF-IDF of the title/description over a weighted longevity vocabulary (plus the
+#                channel's own query and hashtag terms), as one NumPy matrix product
+#   recency    - halves every RANK_HALF_LIFE_HOURS
+#   engagement - log score relative to the best post of the same subreddit/source
+#   quality    - known good domains and having an image
+# and the final score is their weighted sum (RANK_WEIGHTS="relevance,recency,engagement,quality").
+
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+import numpy as np
+from channels import current_channel
+
+HALF_LIFE_HOURS = float(os.getenv("RANK_HALF_LIFE_HOURS", "24"))
+WEIGHTS = np.array([float(w) for w in os.getenv("RANK_WEIGHTS", "0.5,0.2,0.2,0.1").split(",")], dtype=np.float32)
+
+# term -> weight; two-word terms are matched as bigrams
+LONGEVITY_VOCAB = {
+    "longevity": 3.0, "lifespan": 3.0, "healthspan": 3.0, "aging": 2.5, "ageing": 2.5, "healthy aging": 3.0,
+    "anti-aging": 2.0, "senescence": 2.5, "senolytic": 2.5, "senolytics": 2.5, "mortality": 2.0,
+    "study": 1.5, "trial": 2.0, "clinical trial": 2.5, "randomized": 2.0, "research": 1.2, "researchers": 1.2,
+    "evidence": 1.2, "meta-analysis": 2.5, "cohort": 1.5, "science": 1.0, "scientists": 1.0,
+    "exercise": 2.0, "fitness": 1.5, "strength": 1.2, "cardio": 1.2, "walking": 1.2, "steps": 1.0, "vo2": 2.0,
+    "sleep": 2.0, "circadian": 2.0, "nutrition": 2.0, "diet": 1.8, "protein": 1.5, "fasting": 2.0,
+    "intermittent fasting": 2.5, "caloric restriction": 2.5, "mediterranean": 1.5, "fiber": 1.2,
+    "metabolic": 1.8, "metabolism": 1.8, "insulin": 1.5, "glucose": 1.5, "cholesterol": 1.2,
+    "inflammation": 1.8, "mitochondria": 2.0, "mitochondrial": 2.0, "autophagy": 2.5, "telomeres": 2.0,
+    "epigenetic": 2.0, "nad": 1.8, "rapamycin": 2.5, "metformin": 2.0, "supplement": 1.0, "supplements": 1.0,
+    "heart": 1.2, "cardiovascular": 1.8, "brain": 1.2, "cognitive": 1.5, "dementia": 1.8, "alzheimer's": 1.8,
+    "cancer": 1.2, "diabetes": 1.5, "obesity": 1.2, "blood pressure": 1.5, "muscle": 1.2, "bone": 1.0,
+    "stress": 1.0, "wellness": 1.0, "health": 0.8, "healthy": 0.8, "biohacking": 1.5, "biomarkers": 2.0,
+}
+_QUERY_STOPWORDS = {"and", "or", "not"}
+
+# Domain (or parent domain) -> 0..1
+SOURCE_QUALITY = {
+    "nature.com": 1.0, "science.org": 1.0, "cell.com": 1.0, "nih.gov": 1.0, "thelancet.com": 1.0,
+    "nejm.org": 1.0, "bmj.com": 0.9, "jamanetwork.com": 0.9, "plos.org": 0.8, "sciencedaily.com": 0.8,
+    "medicalxpress.com": 0.7, "eurekalert.org": 0.7, "statnews.com": 0.7, "newscientist.com": 0.7,
+    "harvard.edu": 0.8, "reuters.com": 0.6, "apnews.com": 0.6, "bbc.co.uk": 0.6, "theguardian.com": 0.5,
+    "i.redd.it": 0.3, "imgur.com": 0.2, "youtube.com": 0.1,
+}
+
+_TOKEN = re.compile(r"[a-z0-9][a-z0-9'\-]*")
+
+def tokens(text: str) -> list[str]:
+    words = _TOKEN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class Ranker:
+    def __init__(self, vocabulary: dict[str, float]):
+        # Built once per vocabulary: term -> column, and the column weights
+        self.index = {term: i for i, term in enumerate(vocabulary)}
+        self.term_weights = np.array(list(vocabulary.values()), dtype=np.float32)
+
+    def relevance(self, texts: list[str]) -> np.ndarray:
+        rows, cols, lengths = [], [], np.ones(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            toks = tokens(text)
+            lengths[row] = max(len(toks), 1)
+            for tok in toks:
+                col = self.index.get(tok)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+        counts = np.zeros((len(texts), len(self.index)), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1.0)
+        df = np.count_nonzero(counts, axis=0)
+        idf = np.log((1.0 + len(texts)) / (1.0 + df)) + 1.0
+        tfidf = np.log1p(counts) * idf
+        return (tfidf @ self.term_weights) / np.sqrt(lengths)
+
+    def features(self, candidates: list[dict], now: float | None = None) -> np.ndarray:
+        now = time.time() if now is None else now
+        texts = [f"{c.get('title') or ''} {(c.get('item') or {}).get('description') or ''}" for c in candidates]
+        relevance = self.relevance(texts)
+
+        published = np.array([_timestamp(c.get("published_at")) for c in candidates], dtype=np.float64)
+        age_hours = np.clip((now - published) / 3600.0, 0.0, None)
+        recency = np.nan_to_num(0.5 ** (age_hours / HALF_LIFE_HOURS), nan=0.0)
+
+        scores = np.log1p(np.clip(np.array([c.get("score") or 0 for c in candidates], dtype=np.float64), 0, None))
+        _, group = np.unique([str(c.get("subreddit") or c.get("type")) for c in candidates], return_inverse=True)
+        best = np.zeros(group.max() + 1)
+        np.maximum.at(best, group, scores)
+        engagement = np.divide(scores, best[group], out=np.zeros_like(scores), where=best[group] > 0)
+
+        quality = np.array([0.6 * _domain_quality(c.get("url")) + 0.4 * bool(c.get("image_url")) for c in candidates])
+
+        top = relevance.max()
+        relevance = relevance / top if top > 0 else relevance
+        return np.column_stack([relevance, recency, engagement, quality]).astype(np.float32)
+
+    def scores(self, candidates: list[dict], now: float | None = None) -> np.ndarray:
+        if not candidates:
+            return np.zeros(0, dtype=np.float32)
+        return self.features(candidates, now) @ WEIGHTS
+
+    def rank(self, candidates: list[dict], now: float | None = None) -> list[dict]:
+        order = np.argsort(-self.scores(candidates, now), kind="stable")
+        return [candidates[i] for i in order]
+
+    def best(self, candidates: list[dict], now: float | None = None) -> dict | None:
+        if not candidates:
+            return None
+        return candidates[int(np.argmax(self.scores(candidates, now)))]
+
+def _timestamp(value) -> float:
+    # NewsAPI sends ISO 8601, Reddit epoch seconds
+    if value is None or value == "":
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return math.nan
+
+def _domain_quality(url: str | None) -> float:
+    try:
+        host = (urlsplit(url or "").hostname or "").lower()
+    except ValueError:
+        return 0.0
+    while host:
+        if host in SOURCE_QUALITY:
+            return SOURCE_QUALITY[host]
+        host = host.partition(".")[2]
+    return 0.0
+
+def channel_vocabulary(channel=None) -> dict[str, float]:
+    # The base vocabulary plus the channel's own query and hashtag terms, so a "sleep" channel favors sleep
+    channel = channel or current_channel()
+    vocab = dict(LONGEVITY_VOCAB)
+    for term in _TOKEN.findall(f"{channel.news_query} {channel.hashtags}".lower()):
+        if term not in _QUERY_STOPWORDS:
+            vocab[term] = max(vocab.get(term, 0.0), 2.0)
+    return vocab
+
+_rankers = {}
+_rankers_lock = threading.Lock()
+
+def get_ranker() -> Ranker:
+    channel = current_channel()
+    key = (channel.news_query, channel.hashtags)
+    with _rankers_lock:
+        if key not in _rankers:
+            _rankers[key] = Ranker(channel_vocabulary(channel))
+        return _rankers[key]
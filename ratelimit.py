@@ -0,0 +1,222 @@
+# ratelimit.py - shared retry / rate-limit handling for every upstream API
+#
+# Each upstream (NewsAPI, Reddit, Unsplash and each posting platform) gets its own token bucket,
+# circuit breaker and "blocked until" time learned from Retry-After / rate-limit headers, per
+# account: every channel's platform accounts (and source keys of its own) are limited separately.
+# Waits happen in the calling thread only; sources and platforms run in their own worker threads,
+# so a slow or throttled upstream never holds up the others.
+
+import logging
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from functools import wraps
+import requests
+from channels import current_channel
+from clients import redact
+
+logger = logging.getLogger(__name__)
+
+# requests per minute, burst size
+DEFAULT_LIMITS = {
+    "newsapi": (30, 5),
+    "reddit": (60, 10),
+    "unsplash": (0.8, 5),  # demo apps get 50 requests/hour
+    "twitter": (15, 5),
+    "instagram": (25, 5),
+    "facebook": (60, 10),
+    "bluesky": (30, 10),
+}
+MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "60"))  # longer waits fail fast instead of blocking
+BREAKER_THRESHOLD = int(os.getenv("CIRCUIT_BREAKER_THRESHOLD", "5"))  # consecutive failures before opening
+BREAKER_RESET = float(os.getenv("CIRCUIT_BREAKER_RESET", "300"))  # seconds before a trial call is allowed
+
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Transport errors from the various client libraries, matched by name to avoid importing them all
+NETWORK_ERRORS = {"ConnectionError", "ConnectTimeout", "ReadTimeout", "Timeout", "TimeoutError",
+                  "RequestException", "NetworkError", "ConnectError", "RemoteDisconnected"}
+
+class RateLimited(Exception):
+    pass
+
+class CircuitOpen(Exception):
+    pass
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst: int):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + 1)
+
+class CircuitBreaker:
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_after: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            # Half-open: let one trial call through once the reset period is over
+            if time.monotonic() - self.opened_at >= self.reset_after:
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+class Upstream:
+    def __init__(self, name: str, per_minute: float, burst: int):
+        self.name = name
+        self.bucket = TokenBucket(per_minute, burst)
+        self.breaker = CircuitBreaker()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def block_for(self, seconds: float):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def observe(self, headers):
+        # Proactively back off when the server says the window is used up
+        wait = rate_limit_wait(headers)
+        if wait:
+            self.block_for(wait)
+
+    def wait_turn(self, max_wait: float = MAX_WAIT):
+        if not self.breaker.allow():
+            raise CircuitOpen(f"{self.name}: circuit open after repeated failures")
+        wait = max(self.blocked_until - time.monotonic(), 0.0)
+        wait += self.bucket.reserve()
+        if wait > max_wait:
+            self.bucket.refund()
+            raise RateLimited(f"{self.name}: rate limited for another {wait:.0f}s")
+        if wait > 0:
+            time.sleep(wait)
+
+_upstreams = {}
+_registry_lock = threading.Lock()
+
+# Source APIs whose quota belongs to a key that channels may share (see channels.SHARED_SETTINGS)
+SOURCE_KEYS = {"newsapi": "NEWSAPI_KEY", "reddit": "REDDIT_CLIENT_ID", "unsplash": "UNSPLASH_ACCESS_KEY"}
+
+def account_of(name: str) -> str:
+    """Whose limits a call to `name` counts against: the current channel's own account, or "" if shared."""
+    if name.startswith("feed:"):
+        return ""  # public feeds, limited per host
+    channel = current_channel()
+    if name in SOURCE_KEYS:
+        setting = SOURCE_KEYS[name]
+        return channel.name if channel.setting(setting) != os.getenv(setting) else ""
+    return channel.name  # posting platforms: every channel posts with its own account
+
+def get_upstream(name: str, account: str = "") -> Upstream:
+    # One bucket, breaker and Retry-After per account, so one channel's 429 never blocks another's
+    with _registry_lock:
+        if (account, name) not in _upstreams:
+            per_minute, burst = DEFAULT_LIMITS.get(name, (60, 10))
+            per_minute = float(os.getenv(f"RATE_LIMIT_{name.upper()}", per_minute))
+            _upstreams[account, name] = Upstream(f"{account}/{name}" if account else name, per_minute, burst)
+        return _upstreams[account, name]
+
+def _response_of(exc):
+    response = getattr(exc, "response", None)
+    return response if getattr(response, "status_code", None) is not None else None
+
+def rate_limit_wait(headers) -> float | None:
+    """Seconds to wait according to Retry-After or an exhausted X-RateLimit window, if any."""
+    if not headers:
+        return None
+    headers = {k.lower(): v for k, v in dict(headers).items()}
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    remaining = headers.get("x-ratelimit-remaining") or headers.get("x-rate-limit-remaining")
+    reset = headers.get("x-ratelimit-reset") or headers.get("x-rate-limit-reset")
+    try:
+        if remaining is not None and float(remaining) < 1 and reset:
+            reset = float(reset)
+            # Reddit sends seconds until reset, Twitter an epoch timestamp
+            return max(reset - time.time(), 0.0) if reset > 1e9 else reset
+    except ValueError:
+        pass
+    return None
+
+def is_retryable(exc, idempotent: bool = True) -> bool:
+    response = _response_of(exc)
+    if response is not None:
+        # A 429 means the request was refused, so even non-idempotent calls can be repeated
+        return response.status_code == 429 or (idempotent and response.status_code in RETRYABLE_STATUS)
+    return idempotent and (isinstance(exc, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+                           or type(exc).__name__ in NETWORK_ERRORS)
+
+def call(upstream_name: str, func, *args, retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+         idempotent: bool = True, **kwargs):
+    """Call func through the upstream's limiter, retrying transient failures with jittered backoff."""
+    upstream = get_upstream(upstream_name, account_of(upstream_name))
+    for attempt in range(retries):
+        upstream.wait_turn()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            response = _response_of(e)
+            retryable = is_retryable(e, idempotent)
+            if response is not None:
+                upstream.observe(response.headers)
+                if response.status_code == 429:
+                    upstream.block_for(rate_limit_wait(response.headers) or base_delay * 2 ** attempt)
+            if retryable or response is None or response.status_code >= 500:
+                upstream.breaker.failure()
+            if not retryable or attempt == retries - 1:
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))  # full jitter
+            logger.warning(f"[{upstream_name}] attempt {attempt + 1} failed: {redact(e)}. Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+        else:
+            upstream.breaker.success()
+            if getattr(result, "headers", None) is not None:
+                upstream.observe(result.headers)
+            return result
+
+def with_retries(upstream_name: str, **options):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            return call(upstream_name, func, *args, **options, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,95 @@
+# source_state.py - what each content source has already ingested, so fetches can be incremental
+#
+# A source (e.g. "reddit:longevity+Biohackers") keeps its listing cursors in `cursors` and the
+# entries it has parsed in `entries`, with their last known data (scores included). A run then
+# only fetches and parses what is new, and still ranks everything inside its window.
+
+import json
+import os
+import time
+from sqlite_store import SQLiteStore, per_channel
+
+SOURCE_STATE_DB = os.getenv("SOURCE_STATE_DB", "sources.db")
+
+class SourceState(SQLiteStore):
+    def __init__(self, path: str = SOURCE_STATE_DB):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS cursors (
+                source TEXT PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT '{}',
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS entries (
+                source TEXT,
+                id TEXT,
+                data TEXT,
+                published_at REAL,
+                refreshed_at REAL,
+                PRIMARY KEY (source, id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_published ON entries (source, published_at);
+        """)
+
+    def cursor(self, source: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT state FROM cursors WHERE source = ?", (source,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def set_cursor(self, source: str, **state):
+        # Merged into the saved state; a None value removes that key
+        with self._lock, self._db:
+            row = self._db.execute("SELECT state FROM cursors WHERE source = ?", (source,)).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **state}
+            merged = {k: v for k, v in merged.items() if v is not None}
+            self._db.execute("INSERT OR REPLACE INTO cursors (source, state, updated_at) VALUES (?, ?, ?)",
+                             (source, json.dumps(merged), time.time()))
+
+    def known(self, source: str, ids: list[str]) -> set[str]:
+        if not ids:
+            return set()
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id FROM entries WHERE source = ? AND id IN ({','.join('?' * len(ids))})", (source, *ids)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add(self, source: str, entries: dict[str, dict], published: dict[str, float] | None = None):
+        """Insert or update entries (id -> data); published_at is only set when an entry is first added."""
+        now = time.time()
+        published = published or {}
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO entries (source, id, data, published_at, refreshed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (source, id) DO UPDATE SET data = excluded.data, refreshed_at = excluded.refreshed_at",
+                [(source, id_, json.dumps(data), published.get(id_, now), now) for id_, data in entries.items()],
+            )
+
+    def entries(self, source: str, since: float = 0) -> dict[str, dict]:
+        """id -> data of the entries published since `since`, newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, data FROM entries WHERE source = ? AND published_at >= ? ORDER BY published_at DESC",
+                (source, since),
+            ).fetchall()
+        return {id_: json.loads(data) for id_, data in rows}
+
+    def stale(self, source: str, published_since: float, refreshed_before: float, limit: int) -> list[str]:
+        """Entries published since `published_since` whose data is older than `refreshed_before`, least fresh first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM entries WHERE source = ? AND published_at >= ? AND refreshed_at < ? "
+                "ORDER BY refreshed_at LIMIT ?",
+                (source, published_since, refreshed_before, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def remove(self, source: str, ids):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM entries WHERE source = ? AND id = ?", [(source, id_) for id_ in ids])
+
+    def prune(self, source: str, before: float) -> int:
+        with self._lock, self._db:
+            return self._db.execute("DELETE FROM entries WHERE source = ? AND published_at < ?",
+                                    (source, before)).rowcount
+
+get_source_state = per_channel(SourceState, SOURCE_STATE_DB)
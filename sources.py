@@ -1,81 +1,220 @@
-# sources.py - Enhanced with retry logic
+# sources.py - Enhanced with retry logic (see ratelimit.py)
 
+import logging
 import os
-import random
-import requests
-import praw
 import time
-from functools import wraps
-
-NEWSAPI_KEY = os.getenv("NEWSAPI_KEY")
-REDDIT_CLIENT_ID = os.getenv("REDDIT_CLIENT_ID")
-REDDIT_CLIENT_SECRET = os.getenv("REDDIT_CLIENT_SECRET")
-REDDIT_USER_AGENT = os.getenv("REDDIT_USER_AGENT", "longevity-curator/1.0")
-
-NEWS_QUERY = "(longevity OR \"healthspan\" OR \"anti-aging\" OR \"healthy aging\" OR nutrition OR exercise OR sleep) AND (study OR research OR science OR evidence OR trial)"
-NEWS_SOURCES_ENDPOINT = "https://newsapi.org/v2/everything"
-REDDIT_SUBS = ["Longevity","Nutrition","Biohackers","HealthyFood","Fitness"]
-
-def retry_on_failure(max_retries=3, delay=5):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    if attempt == max_retries - 1:
-                        logger.error(f"{func.__name__} failed after {max_retries} attempts: {e}")
-                        return None
-                    logger.warning(f"{func.__name__} attempt {attempt + 1} failed: {e}. Retrying in {delay}s...")
-                    time.sleep(delay * (attempt + 1))  # Exponential backoff
-            return None
-        return wrapper
-    return decorator
-
-@retry_on_failure(max_retries=3, delay=2)
-def fetch_news_article() -> dict | None:
-    if not NEWSAPI_KEY:
-        return None
+from concurrent.futures import ThreadPoolExecutor
+from httpcache import cached_get
+from clients import redact
+from ratelimit import with_retries
+from channels import current_channel, setting, submit
+from metrics import span
+from plugins import Plugin, enabled
+from ranking import get_ranker
+from source_state import get_source_state
+from feeds import fetch_feed_articles
+
+NEWS_CACHE_TTL = int(os.getenv("NEWS_CACHE_TTL", "1800"))  # seconds
+
+# Query, subreddits and API keys come from the current channel (see channels.py)
+NEWS_SOURCES_ENDPOINT = os.getenv("NEWSAPI_ENDPOINT", "https://newsapi.org/v2/everything")
+# PRAW's endpoints, overridable to point at a local stand-in (see bench/fakes.py)
+REDDIT_URLS = {k: v for k, v in (("oauth_url", os.getenv("REDDIT_OAUTH_URL")), ("reddit_url", os.getenv("REDDIT_URL"))) if v}
+# Reddit is read incrementally: new posts since the last run's cursor, plus fresh scores for young posts
+REDDIT_WINDOW_HOURS = float(os.getenv("REDDIT_WINDOW_HOURS", "168"))  # posts ranked, like the old top-of-week listing
+REDDIT_REFRESH_HOURS = float(os.getenv("REDDIT_REFRESH_HOURS", "24"))  # posts this young get their score re-read
+REDDIT_REFRESH_EVERY = float(os.getenv("REDDIT_REFRESH_MINUTES", "60")) * 60  # at most once per this interval
+REDDIT_PAGE = 100  # Reddit's largest listing page
+REDDIT_MAX_PAGES = int(os.getenv("REDDIT_MAX_PAGES", "10"))  # the first run backfills at most this many pages
+
+logger = logging.getLogger(__name__)
+
+@with_retries("newsapi", retries=3, base_delay=2)
+def _news_request(params: dict) -> dict:
+    r = cached_get(NEWS_SOURCES_ENDPOINT, params=params, ttl=NEWS_CACHE_TTL, timeout=15)
+    r.raise_for_status()
+    return r.json()
+
+def fetch_news_articles() -> list[dict]:
+    api_key = setting("NEWSAPI_KEY")
+    if not api_key:
+        return []
     try:
-        r = requests.get(NEWS_SOURCES_ENDPOINT, params={"q": NEWS_QUERY,"language":"en","sortBy":"publishedAt","pageSize":20,"apiKey":NEWSAPI_KEY}, timeout=15)
-        r.raise_for_status()
-        articles = r.json().get("articles", [])
-        if not articles:
-            return None
-        with_img = [a for a in articles if a.get("urlToImage")] or articles
-        return random.choice(with_img)
-    except Exception:
+        with span("fetch", upstream="newsapi"):
+            data = _news_request({"q": current_channel().news_query,"language":"en","sortBy":"publishedAt","pageSize":20,"apiKey":api_key})
+        return data.get("articles", [])
+    except Exception as e:
+        logger.warning(f"[Sources] NewsAPI fetch failed: {redact(e)}")
+        return []
+
+def fetch_news_article() -> dict | None:
+    articles = fetch_news_articles()
+    if not articles:
         return None
+    with_img = [a for a in articles if a.get("urlToImage")] or articles
+    return get_ranker().best([_news_candidate(a) for a in with_img])["item"]
 
 def _reddit_client():
-    if not (REDDIT_CLIENT_ID and REDDIT_CLIENT_SECRET):
+    client_id, client_secret = setting("REDDIT_CLIENT_ID"), setting("REDDIT_CLIENT_SECRET")
+    if not (client_id and client_secret):
         return None
-    return praw.Reddit(client_id=REDDIT_CLIENT_ID,client_secret=REDDIT_CLIENT_SECRET,user_agent=REDDIT_USER_AGENT)
+    import praw  # slow to import; only loaded when Reddit is configured
+    return praw.Reddit(client_id=client_id,client_secret=client_secret,user_agent=setting("REDDIT_USER_AGENT", "longevity-curator/1.0"),**REDDIT_URLS)
 
-@retry_on_failure(max_retries=2, delay=3)
-def fetch_reddit_post() -> dict | None:
+def _extract_img(p: dict):
+    try:
+        return p["preview"]["images"][0]["source"]["url"]
+    except (KeyError, IndexError, TypeError):
+        pass
+    if str(p.get("url")).lower().endswith((".jpg", ".jpeg", ".png")):
+        return p["url"]
+    return None
+
+def _reddit_images(p: dict) -> list[dict]:
+    # Every size Reddit offers (the preview source plus its downscaled resolutions), for the image resolver
+    images = []
+    try:
+        preview = p["preview"]["images"][0]
+        for res in [preview["source"]] + list(preview.get("resolutions") or []):
+            images.append({"url": res["url"], "width": res.get("width"), "height": res.get("height")})
+    except (KeyError, IndexError, TypeError):
+        pass
+    if str(p.get("url")).lower().endswith((".jpg", ".jpeg", ".png")):
+        images.append({"url": p["url"]})
+    return images
+
+def _reddit_post(p: dict) -> dict:
+    # Just the fields we use, read straight from the listing JSON (no PRAW Submission objects)
+    return {"title":p.get("title"),"url":p.get("url"),"image_url":_extract_img(p),"images":_reddit_images(p),
+            "score":p.get("score") or 0,"subreddit":p.get("subreddit"),"created_utc":p.get("created_utc")}
+
+@with_retries("reddit", retries=2, base_delay=3)
+def _reddit_get(reddit, path: str, params: dict) -> dict:
+    # PRAW's raw request path: authenticated and rate limited, but returns the JSON as is
+    return reddit.request(method="GET", path=path, params=params)
+
+def _listing(data: dict) -> list[dict]:
+    return [c["data"] for c in (data.get("data") or {}).get("children") or [] if c.get("kind") == "t3"]
+
+def _ingest_new_posts(reddit, source: str, listing: str, state) -> int:
+    """Add the posts submitted since the last run to the source state; returns how many were new."""
+    cutoff = time.time() - REDDIT_WINDOW_HOURS * 3600
+    before = state.cursor(source).get("before")
+    newest, added = None, 0
+    params = {"limit": REDDIT_PAGE}
+    if before:
+        params["before"] = before
+    for _ in range(REDDIT_MAX_PAGES):
+        page = _reddit_get(reddit, f"/r/{listing}/new", params)
+        posts = _listing(page)
+        if not posts and "before" in params and params["before"] == before:
+            # Nothing newer than the cursor, or the cursor post was removed (Reddit then returns nothing
+            # at all): read the newest page once and let the seen set skip what we have
+            del params["before"]
+            continue
+        known = state.known(source, [p["name"] for p in posts])
+        fresh = [p for p in posts if p["name"] not in known and (p.get("created_utc") or 0) >= cutoff]
+        if fresh:
+            state.add(source, {p["name"]: _reddit_post(p) for p in fresh},
+                      {p["name"]: p.get("created_utc") or 0 for p in fresh})
+            added += len(fresh)
+        if posts:
+            top = max(posts, key=lambda p: p.get("created_utc") or 0)
+            if newest is None or (top.get("created_utc") or 0) > (newest.get("created_utc") or 0):
+                newest = top
+        if "before" in params:
+            # Walking towards newer posts until a short page
+            if len(posts) < REDDIT_PAGE or not (page.get("data") or {}).get("before"):
+                break
+            params["before"] = page["data"]["before"]
+        else:
+            # Walking back in time until we reach posts we have, or the end of the window
+            after = (page.get("data") or {}).get("after")
+            if len(fresh) < len(posts) or not after:
+                break
+            params["after"] = after
+    if newest is not None:
+        state.set_cursor(source, before=newest["name"])
+    return added
+
+def _refresh_scores(reddit, source: str, state) -> int:
+    # Young posts are still gaining votes: re-read the least recently updated ones, 100 per request
+    now = time.time()
+    ids = state.stale(source, now - REDDIT_REFRESH_HOURS * 3600, now - REDDIT_REFRESH_EVERY, REDDIT_PAGE)
+    if not ids:
+        return 0
+    posts = _listing(_reddit_get(reddit, "/api/info", {"id": ",".join(ids)}))
+    live = [p for p in posts if not p.get("removed_by_category")]
+    state.add(source, {p["name"]: _reddit_post(p) for p in live})
+    state.remove(source, set(ids) - {p["name"] for p in live})  # deleted or removed by moderators since
+    return len(live)
+
+def fetch_reddit_posts() -> list[dict]:
     reddit = _reddit_client()
     if not reddit:
-        return None
+        return []
+    listing = "+".join(current_channel().reddit_subs)  # one multireddit listing instead of a request per subreddit
+    source = f"reddit:{listing}"
+    state = get_source_state()
     try:
-        sub = reddit.subreddit(random.choice(REDDIT_SUBS))
-        candidates = list(sub.top(time_filter="week", limit=25))
-        if not candidates:
-            return None
-        def extract_img(p):
-            try:
-                if hasattr(p, "preview"):
-                    return p.preview["images"][0]["source"]["url"]
-            except Exception:
-                pass
-            if str(p.url).lower().endswith((".jpg", ".jpeg", ".png")):
-                return p.url
-            return None
-        enriched = [{"title":p.title,"url":p.url,"image_url":extract_img(p),"score":getattr(p,"score",0)} for p in candidates]
-        enriched.sort(key=lambda x:x.get("score",0),reverse=True)
-        top = enriched[:8] if len(enriched)>=8 else enriched
-        return random.choice(top) if top else None
-    except Exception:
-        return None
-    
+        with span("fetch", upstream="reddit"):
+            added = _ingest_new_posts(reddit, source, listing, state)
+            refreshed = _refresh_scores(reddit, source, state)
+        logger.info(f"[Sources] Reddit: {added} new posts, {refreshed} scores refreshed")
+    except Exception as e:
+        # Still rank what we already have; its scores are just a little older
+        logger.warning(f"[Sources] Reddit fetch failed: {redact(e)}")
+    cutoff = time.time() - REDDIT_WINDOW_HOURS * 3600
+    state.prune(source, cutoff)
+    return list(state.entries(source, cutoff).values())
+
+def fetch_reddit_post() -> dict | None:
+    best = get_ranker().best([_reddit_candidate(p) for p in fetch_reddit_posts()])
+    return best["item"] if best else None
+
+def _news_candidate(a: dict) -> dict:
+    return {"type":"news","title":a.get("title") or "","url":a.get("url") or "","image_url":a.get("urlToImage"),
+            "images":[{"url":a["urlToImage"]}] if a.get("urlToImage") else [],
+            "score":0,"published_at":a.get("publishedAt"),"item":a}
+
+def _reddit_candidate(p: dict) -> dict:
+    return {"type":"reddit","title":p.get("title") or "","url":p.get("url") or "","image_url":p.get("image_url"),
+            "images":p.get("images") or ([{"url":p["image_url"]}] if p.get("image_url") else []),
+            "score":p.get("score") or 0,"published_at":p.get("created_utc"),"subreddit":p.get("subreddit"),"item":p}
+
+def news_candidates() -> list[dict]:
+    return [_news_candidate(a) for a in fetch_news_articles()]
+
+def reddit_candidates() -> list[dict]:
+    return [_reddit_candidate(p) for p in fetch_reddit_posts()]
+
+def feed_candidates() -> list[dict]:
+    # Feed entries are NewsAPI-shaped articles, so they rank and caption as news
+    return [_news_candidate(a) for a in fetch_feed_articles()]
+
+# Each source returns normalized candidates; CONTENT_SOURCES limits which are used
+SOURCES = [
+    Plugin("news", "NewsAPI", "sources:news_candidates", ("NEWSAPI_KEY",)),
+    Plugin("reddit", "Reddit", "sources:reddit_candidates", ("REDDIT_CLIENT_ID", "REDDIT_CLIENT_SECRET")),
+    Plugin("feeds", "RSS/Atom feeds", "sources:feed_candidates", ("FEED_URLS",)),
+]
+
+def _fetch(source: Plugin) -> list[dict]:
+    # Loaded in the worker, so a source whose import fails is isolated like one whose fetch fails
+    return source.load()()
+
+def fetch_candidates() -> list[dict]:
+    # Fetch every enabled upstream at once and normalize into one pool
+    sources = enabled(SOURCES, "CONTENT_SOURCES")
+    if not sources:
+        return []
+    with ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="sources") as pool:
+        futures = {source: submit(pool, _fetch, source) for source in sources}
+    candidates = []
+    for source, future in futures.items():
+        try:
+            candidates += future.result()
+        except Exception as e:
+            # The other sources' candidates still make up the pool
+            logger.warning(f"[Sources] {source.name} failed: {redact(e)}")
+    return candidates
@@ -0,0 +1,56 @@
+# sqlite_store.py - what the SQLite-backed stores (history, queue, image store, source state, HTTP cache) share
+#
+# A store is one connection shared by every thread behind a lock, in WAL mode so a reader never
+# waits for the writer. Stores that belong to a channel are opened once per channel, on first use.
+# The near-duplicate indexes (title SimHashes in history.py, image dHashes in image_store.py) split
+# each 64-bit hash into n bands: two hashes within n - 1 bits of each other share at least one band,
+# so a band lookup finds every candidate and a Hamming check confirms it. A lookup reads about
+# N * n / 2^(64/n) of N stored hashes: ~N/32 with 8 bands of 8 bits (still linear, with a small
+# constant), a handful with 4 bands of 16 bits until the history holds millions of posts.
+
+import sqlite3
+import threading
+from channels import current_channel
+
+BANDS = 8  # allows distances up to 7 bits
+_MASK64 = (1 << 64) - 1
+
+class SQLiteStore:
+    def __init__(self, path: str, schema: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(schema)
+
+def per_channel(factory, filename: str):
+    """A get_<store>() that opens one factory(path) per channel, on first use."""
+    instances = {}
+    lock = threading.Lock()
+    def get():
+        path = current_channel().path(filename)
+        with lock:
+            if path not in instances:
+                instances[path] = factory(path)
+            return instances[path]
+    return get
+
+def signed64(h: int) -> int:
+    # SQLite integers are signed 64-bit
+    return h - (1 << 64) if h >= 1 << 63 else h
+
+def unsigned64(h: int) -> int:
+    return h & _MASK64
+
+def hash_bands(h: int, bands: int = BANDS) -> list[tuple[int, int]]:
+    bits = 64 // bands
+    mask = (1 << bits) - 1
+    return [(i, h >> (i * bits) & mask) for i in range(bands)]
+
+def band_match(h: int, bands: int = BANDS) -> tuple[str, list[int]]:
+    """WHERE clause (over `band` and `value` columns) and its arguments: rows sharing a band with h."""
+    clause = " OR ".join(["(band = ? AND value = ?)"] * bands)
+    return clause, [x for pair in hash_bands(h, bands) for x in pair]
+
+def any_within(stored, h: int, max_distance: int) -> bool:
+    """Whether any of the stored (signed) hashes differs from h in at most max_distance bits."""
+    return any(bin(unsigned64(other) ^ h).count("1") <= max_distance for other in stored)
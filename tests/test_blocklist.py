@@ -0,0 +1,39 @@
+from blocklist import Blocklist, read_rules
+
+def test_domains_match_whole_labels_and_subdomains():
+    blocklist = Blocklist(domains=["ad.com", "https://www.spammyhealth.com/", "*.tracker.net"])
+    assert blocklist.domain_blocked("https://ad.com/a")
+    assert blocklist.domain_blocked("https://cdn.images.ad.com/a.jpg")
+    assert blocklist.domain_blocked("http://AD.COM./x")
+    assert not blocklist.domain_blocked("https://bad.com/a")
+    assert not blocklist.domain_blocked("https://bad.com.au/a")
+    assert not blocklist.domain_blocked("https://ad.com.au/a")
+    assert blocklist.domain_blocked("https://www.spammyhealth.com/post")
+    assert not blocklist.domain_blocked("https://spammyhealth.com/post")
+    assert blocklist.domain_blocked("https://pixel.tracker.net/p")
+    assert not blocklist.domain_blocked("https://[2001:db8::1/a")
+
+def test_phrases_match_on_word_boundaries():
+    blocklist = Blocklist(keywords=["ad", "miracle cure", "Get rich"])
+    assert blocklist.keyword_blocked("This AD is everywhere")
+    assert not blocklist.keyword_blocked("A bad day for adverts")
+    assert blocklist.keyword_blocked("The miracle  cure, finally!")
+    assert not blocklist.keyword_blocked("A miracle, not a cure")
+    assert not blocklist.keyword_blocked("miracles cure nothing")
+    assert blocklist.keyword_blocked("how to get rich")
+
+def test_is_blocked_checks_both():
+    blocklist = Blocklist(domains=["ad.com"], keywords=["miracle cure"])
+    assert blocklist.is_blocked("Sleep study", "https://sub.ad.com/x")
+    assert blocklist.is_blocked("A miracle cure", "https://example.org/x")
+    assert not blocklist.is_blocked("Sleep study", "https://example.org/x")
+    assert not blocklist.is_blocked(None, None)
+
+def test_rules_file(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("# spam\ndomain: spammy.test  # whole site\nkeyword:detox tea\nnonsense line\n")
+    domains, keywords = read_rules(str(path))
+    blocklist = Blocklist(domains, keywords)
+    assert (blocklist.domain_count, blocklist.keyword_count) == (1, 1)
+    assert blocklist.domain_blocked("https://www.spammy.test/")
+    assert blocklist.keyword_blocked("Best detox tea of 2026")
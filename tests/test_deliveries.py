@@ -0,0 +1,129 @@
+import threading
+import time
+import pytest
+import bot
+from content_queue import ContentQueue
+from history import PostHistory
+from image_store import ImageStore
+from plugins import Plugin
+
+ITEM = {"type": "news", "caption": "A study", "url": "https://example.org/study", "title": "A study on sleep"}
+
+class FakePlatform(Plugin):
+    def load(self):
+        return UPLOADERS[self.key]
+
+UPLOADERS = {}
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    history = PostHistory(str(tmp_path / "history.db"))
+    store = ImageStore(str(tmp_path / "images.db"))
+    monkeypatch.setattr(bot, "get_history", lambda: history)
+    monkeypatch.setattr(bot, "get_image_store", lambda: store)
+    monkeypatch.setenv("PUBLISH_TIMEOUT_SLOW", "0.2")
+    UPLOADERS.clear()
+    return ContentQueue(str(tmp_path / "queue.db"))
+
+def _post(queue):
+    return queue.claim(queue.push(dict(ITEM), {"fast": b"jpeg", "slow": b"jpeg"}))
+
+def _status(queue, post_id):
+    return queue._db.execute("SELECT status FROM posts WHERE id = ?", (post_id,)).fetchone()[0]
+
+def _delivery(queue, post_id, platform):
+    return queue._db.execute("SELECT status, attempts FROM deliveries WHERE post_id = ? AND platform = ?",
+                             (post_id, platform)).fetchone()
+
+PLATFORMS = [FakePlatform("fast", "Fast", "fake:fast"), FakePlatform("slow", "Slow", "fake:slow")]
+
+def test_failed_platform_is_retried_alone(queue):
+    calls = []
+    UPLOADERS["fast"] = lambda caption, image: calls.append("fast") or "f1"
+    def failing(caption, image):
+        calls.append("slow")
+        raise RuntimeError("503")
+    UPLOADERS["slow"] = failing
+    post_id, item, blobs = _post(queue)
+    bot._deliver(queue, post_id, item, blobs, PLATFORMS)
+    assert _status(queue, post_id) == "retry"
+    assert _delivery(queue, post_id, "slow") == ("failed", 1)
+
+    UPLOADERS["slow"] = lambda caption, image: calls.append("slow") or "s1"
+    post_id, item, blobs = queue.pop_retry()
+    assert blobs == {"fast": b"jpeg", "slow": b"jpeg"}
+    bot._deliver(queue, post_id, item, blobs, PLATFORMS)
+    assert sorted(calls) == ["fast", "slow", "slow"]
+    assert _status(queue, post_id) == "published"
+
+def test_errors_are_journaled_without_tokens(queue):
+    def failing(caption, image):
+        raise RuntimeError("400 Client Error for url: https://graph.test/v19.0/1/media?access_token=secret&x=1")
+    UPLOADERS["fast"] = failing
+    post_id, item, blobs = _post(queue)
+    (result,) = bot._deliver(queue, post_id, item, blobs, PLATFORMS[:1])
+    (error,) = queue._db.execute("SELECT error FROM deliveries WHERE post_id = ?", (post_id,)).fetchone()
+    assert "secret" not in error and "secret" not in result.error
+    assert "https://graph.test/v19.0/1/media" in error
+
+def test_deadline_exceeded_delivery_stays_outstanding(queue):
+    release = threading.Event()
+    def slow(caption, image):
+        release.wait(5)
+        raise RuntimeError("gave up late")
+    UPLOADERS["fast"] = lambda caption, image: "f1"
+    UPLOADERS["slow"] = slow
+    post_id, item, blobs = _post(queue)
+    results = bot._deliver(queue, post_id, item, blobs, PLATFORMS)
+    assert [r.success for r in results] == [True, False]
+
+    # The upload is still running: the post keeps its images and isn't resumed yet
+    assert _status(queue, post_id) == "retry"
+    assert _delivery(queue, post_id, "slow") == ("sending", 1)
+    assert queue.pop_retry() is None
+    assert queue._images(post_id)
+
+    release.set()
+    for _ in range(50):
+        if _delivery(queue, post_id, "slow")[0] != "sending":
+            break
+        time.sleep(0.02)
+    assert _delivery(queue, post_id, "slow") == ("failed", 1)
+    UPLOADERS["slow"] = lambda caption, image: "s1"
+    post_id, item, blobs = queue.pop_retry()
+    bot._deliver(queue, post_id, item, blobs, PLATFORMS)
+    assert _delivery(queue, post_id, "slow") == ("done", 2)
+    assert _status(queue, post_id) == "published"
+
+def test_late_success_is_recorded_by_resume(queue):
+    release = threading.Event()
+    def late(caption, image):
+        release.wait(5)
+        return "s1"
+    UPLOADERS["slow"] = late
+    platforms = PLATFORMS[1:]
+    post_id, item, blobs = _post(queue)
+    bot._deliver(queue, post_id, item, blobs, platforms)
+    assert not bot.get_history().is_duplicate(ITEM["url"], ITEM["title"])
+
+    release.set()
+    for _ in range(50):
+        if _delivery(queue, post_id, "slow")[0] == "done":
+            break
+        time.sleep(0.02)
+    post_id, item, blobs = queue.pop_retry()
+    assert bot._deliver(queue, post_id, item, blobs, platforms) == []  # nothing left to upload
+    assert bot.get_history().is_duplicate(ITEM["url"], ITEM["title"])
+    assert _status(queue, post_id) == "published"
+
+def test_silent_upload_becomes_unknown_and_is_not_repeated(queue):
+    UPLOADERS["slow"] = lambda caption, image: threading.Event().wait(1)
+    platforms = PLATFORMS[1:]
+    post_id, item, blobs = _post(queue)
+    bot._deliver(queue, post_id, item, blobs, platforms)
+    assert queue.pop_retry() is None
+
+    post_id, item, blobs = queue.pop_retry(resume_after=0)
+    assert _delivery(queue, post_id, "slow")[0] == "unknown"
+    assert bot._deliver(queue, post_id, item, blobs, platforms) == []
+    assert _status(queue, post_id) == "failed"
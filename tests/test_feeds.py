@@ -0,0 +1,68 @@
+import io
+from feeds import parse_feed
+
+RSS = b"""<?xml version="1.0"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/"><channel>
+<title>Bench Journal</title>
+<image><title>Logo</title><url>https://journal.test/logo.png</url></image>
+<item><title>Fasting &amp; the &lt;i&gt;ageing&lt;/i&gt; heart</title><link>https://journal.test/3</link>
+  <guid>j-3</guid><pubDate>Sat, 17 Oct 2026 08:00:00 +0000</pubDate>
+  <description>&lt;p&gt;Mice &lt;b&gt;lived&lt;/b&gt; longer.&lt;/p&gt;</description>
+  <media:content url="https://journal.test/3.jpg" medium="image"/></item>
+<item><title>Sleep and memory</title><link>https://journal.test/2</link><guid>j-2</guid>
+  <description>&lt;img src="https://journal.test/2.png?a=1&amp;amp;b=2"&gt; A cohort study.</description></item>
+<item><title>Already seen</title><link>https://journal.test/1</link><guid>j-1</guid></item>
+<item><title>Never reached</title><link>https://journal.test/0</link><guid>j-0</guid></item>
+</channel></rss>"""
+
+ATOM = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title type="html">Cell &lt;b&gt;Press&lt;/b&gt;</title>
+<entry><title type="html">A &lt;b&gt;study&lt;/b&gt;</title><id>urn:a2</id>
+  <link rel="self" href="https://cell.test/feed/a2"/><link rel="alternate" href="https://cell.test/a2"/>
+  <link rel="enclosure" type="image/jpeg" href="https://cell.test/a2.jpg"/>
+  <updated>2026-10-17T10:00:00Z</updated><published>2026-10-16T09:30:00+02:00</published>
+  <summary>Short summary</summary></entry>
+<entry><title>No link</title><id>urn:a1</id></entry>
+</feed>"""
+
+RDF = b"""<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#" xmlns="http://purl.org/rss/1.0/"
+  xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel rdf:about="https://nature.test/"><title>Nature Aging</title></channel>
+<item rdf:about="https://nature.test/s1"><title>Senolytics trial</title><link>https://nature.test/s1</link>
+  <dc:date>2026-10-16</dc:date></item>
+</rdf:RDF>"""
+
+def test_rss_stops_at_first_known_entry():
+    seen = []
+    def is_known(id_):
+        seen.append(id_)
+        return id_ == "j-1"
+    title, entries = parse_feed(io.BytesIO(RSS), is_known)
+    assert title == "Bench Journal"
+    assert seen == ["j-3", "j-2", "j-1"]
+    assert [e["id"] for e in entries] == ["j-3", "j-2"]
+    first, second = entries
+    assert first["title"] == "Fasting & the ageing heart"
+    assert first["description"] == "Mice lived longer."
+    assert first["image"] == "https://journal.test/3.jpg"
+    assert first["published"] == "2026-10-17T08:00:00Z"
+    assert second["image"] == "https://journal.test/2.png?a=1&b=2"
+    assert second["description"] == "A cohort study."
+    assert second["published"] is None
+
+def test_rss_limit():
+    _, entries = parse_feed(io.BytesIO(RSS), lambda id_: False, limit=1)
+    assert [e["id"] for e in entries] == ["j-3"]
+
+def test_atom_entries():
+    title, entries = parse_feed(io.BytesIO(ATOM), lambda id_: False)
+    assert title == "Cell Press"
+    assert entries == [{"id": "urn:a2", "title": "A study", "url": "https://cell.test/a2",
+                        "image": "https://cell.test/a2.jpg", "description": "Short summary",
+                        "published": "2026-10-16T07:30:00Z"}]
+
+def test_rss1_entries():
+    title, entries = parse_feed(io.BytesIO(RDF), lambda id_: False)
+    assert title == "Nature Aging"
+    assert [(e["id"], e["url"], e["published"]) for e in entries] == [
+        ("https://nature.test/s1", "https://nature.test/s1", "2026-10-16T00:00:00Z")]
@@ -0,0 +1,42 @@
+from history import PostHistory, normalize_url
+
+def test_normalize_url_drops_tracking_and_scheme():
+    assert normalize_url("https://www.Example.org/story/?utm_source=x&b=2&a=1&fbclid=z#top") == "example.org/story?a=1&b=2"
+    assert normalize_url("http://example.org/story") == normalize_url("https://example.org/story/")
+
+def test_malformed_url_is_compared_as_is(tmp_path):
+    assert normalize_url(" https://[2001:db8::1/a ") == "https://[2001:db8::1/a"
+    history = PostHistory(str(tmp_path / "history.db"))
+    assert not history.is_duplicate("https://[2001:db8::1/a", "Fasting and the ageing heart")
+    history.record("https://[2001:db8::1/a", "Fasting and the ageing heart")
+    assert history.is_duplicate("https://[2001:db8::1/a", "Something else entirely")
+
+LONG = ("Researchers at Stanford find that a daily ten minute walk after meals lowers blood sugar spikes "
+        "in adults with prediabetes")
+
+def test_near_duplicate_titles(tmp_path):
+    history = PostHistory(str(tmp_path / "history.db"))
+    history.record("https://example.org/walk", LONG)
+    assert history.is_duplicate("https://other.test/1", LONG.upper() + "!")
+    assert history.is_duplicate("https://other.test/2", LONG + " - ScienceDaily")
+    assert history.is_duplicate("https://other.test/3", "New: " + LONG)
+
+def test_distinct_stories_sharing_words(tmp_path):
+    history = PostHistory(str(tmp_path / "history.db"))
+    history.record("https://example.org/coffee", "Study finds coffee linked to lower mortality")
+    assert not history.is_duplicate("https://example.org/tea", "Study finds tea linked to lower mortality")
+    history.record("https://example.org/walk", LONG)
+    assert not history.is_duplicate("https://example.org/t2d", LONG.replace("prediabetes", "type 2 diabetes"))
+
+def test_old_history_is_reindexed(tmp_path):
+    path = str(tmp_path / "history.db")
+    history = PostHistory(path)
+    history.record("https://example.org/walk", LONG)
+    with history._db as db:
+        # As written before word pairs and 16-bit bands
+        db.execute("UPDATE posts SET simhash = 12345")
+        db.execute("INSERT INTO title_bands VALUES (7, 1, 1)")
+        db.execute("PRAGMA user_version = 0")
+    history = PostHistory(path)
+    assert history.is_duplicate("https://other.test/1", LONG + " - ScienceDaily")
+    assert history._db.execute("SELECT MAX(band) FROM title_bands").fetchone()[0] == 3
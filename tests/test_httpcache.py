@@ -0,0 +1,46 @@
+import sqlite3
+import pytest
+import requests
+from httpcache import HttpCache
+
+class FakeResponse:
+    url = "https://newsapi.test/v2/top-headlines/sources?apiKey=secret&language=en"
+    status_code = 200
+    headers = {"ETag": '"v1"', "Content-Type": "application/json", "Set-Cookie": "session=1"}
+    content = b'{"sources": []}'
+
+class FakeSession:
+    def __init__(self, response=FakeResponse):
+        self.response = response
+        self.calls = []
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append(params)
+        return self.response()
+
+def test_query_string_is_not_stored(tmp_path):
+    path = str(tmp_path / "cache.db")
+    session = FakeSession()
+    cache = HttpCache(path)
+    cache.get("https://newsapi.test/v2/top-headlines/sources", params={"apiKey": "secret"}, session=session)
+    cached = cache.get("https://newsapi.test/v2/top-headlines/sources", params={"apiKey": "secret"}, session=session)
+    assert len(session.calls) == 1 and cached.from_cache
+    assert cached.json() == {"sources": []}
+    dump = "\n".join(sqlite3.connect(path).iterdump())
+    assert "secret" not in dump and "session=1" not in dump
+    assert cached.url == "https://newsapi.test/v2/top-headlines/sources"
+
+def test_existing_entries_are_scrubbed(tmp_path):
+    path = str(tmp_path / "cache.db")
+    with HttpCache(path)._db as db:
+        db.execute("INSERT INTO entries VALUES ('k', 'https://api.test/x?client_id=secret', 200, '{}', x'', 0, 0, 0)")
+    (url,) = HttpCache(path)._db.execute("SELECT url FROM entries").fetchone()
+    assert url == "https://api.test/x"
+
+def test_error_message_has_no_query_string(tmp_path):
+    class Unavailable(FakeResponse):
+        status_code = 503
+    r = HttpCache(str(tmp_path / "cache.db")).get("https://newsapi.test/v2/everything", params={"apiKey": "secret"},
+                                                    session=FakeSession(Unavailable))
+    with pytest.raises(requests.HTTPError) as info:
+        r.raise_for_status()
+    assert "secret" not in str(info.value)
@@ -0,0 +1,26 @@
+from content_queue import ContentQueue
+from image_store import ImageStore
+
+A = 0x0123456789ABCDEF
+NEAR_A = A ^ 0b101  # 2 bits off
+OTHER = ~A & ((1 << 64) - 1)
+
+def test_posted_images_are_repeats(tmp_path):
+    store = ImageStore(str(tmp_path / "images.db"))
+    store.remember("https://img.test/a.jpg", "sha-a", A)
+    assert not store.is_repeat(NEAR_A)  # seen, but never posted
+    store.mark_posted("sha-a", A)
+    assert store.is_repeat(NEAR_A)
+    assert not store.is_repeat(OTHER)
+    assert store.lookup("https://img.test/a.jpg") == ("sha-a", A)
+
+def test_images_of_queued_posts_are_repeats(tmp_path):
+    store = ImageStore(str(tmp_path / "images.db"))
+    queue = ContentQueue(str(tmp_path / "queue.db"))
+    for status, dhash in (("ready", A), ("published", OTHER)):
+        post_id = queue.push({"url": f"https://example.org/{status}", "image_dhash": f"{dhash:016x}"}, {"x": b"jpeg"})
+        queue.mark(post_id, status)
+    queue.push({"url": "https://example.org/card"}, {"x": b"card"})  # rendered cards have no dHash
+    assert queue.image_hashes() == [A]
+    assert store.is_repeat(NEAR_A, queue.image_hashes())
+    assert not store.is_repeat(OTHER, queue.image_hashes())
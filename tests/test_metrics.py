@@ -0,0 +1,8 @@
+from metrics import _fmt
+
+def test_label_values_are_escaped():
+    assert _fmt((("channel", 'say "hi"'), ("path", "C:\\tmp"), ("error", "line1\nline2"))) == \
+        '{channel="say \\"hi\\"",path="C:\\\\tmp",error="line1\\nline2"}'
+
+def test_no_labels():
+    assert _fmt(()) == ""
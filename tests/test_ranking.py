@@ -0,0 +1,43 @@
+import numpy as np
+from ranking import Ranker, LONGEVITY_VOCAB, HALF_LIFE_HOURS, _domain_quality
+
+NOW = 1_800_000_000
+HOUR = 3600
+
+def _candidate(title, hours_old=1, score=0, url="https://example.org/a", subreddit=None, image=True):
+    return {"type": "reddit" if subreddit else "news", "title": title, "url": url, "subreddit": subreddit,
+            "score": score, "published_at": NOW - hours_old * HOUR, "image_url": "https://img.test/a.jpg" if image else None}
+
+def test_best_prefers_relevant_fresh_candidates():
+    ranker = Ranker(LONGEVITY_VOCAB)
+    relevant = _candidate("Randomized clinical trial: intermittent fasting and healthy aging")
+    offtopic = _candidate("Local team wins the cup")
+    stale = _candidate("Randomized clinical trial: intermittent fasting and healthy aging", hours_old=24 * 14)
+    assert ranker.best([offtopic, stale, relevant], now=NOW) is relevant
+    assert ranker.rank([offtopic, stale, relevant], now=NOW) == [relevant, stale, offtopic]
+    assert ranker.best([], now=NOW) is None
+
+def test_engagement_is_relative_to_the_same_subreddit():
+    ranker = Ranker({"sleep": 1.0})
+    big = [_candidate("Sleep", score=s, subreddit="science") for s in (10_000, 1_000)]
+    small = _candidate("Sleep", score=50, subreddit="longevity")
+    features = ranker.features(big + [small], now=NOW)
+    engagement = features[:, 2]
+    assert engagement[0] == engagement[2] == 1.0  # each the best of its own subreddit
+    assert 0 < engagement[1] < 1
+
+def test_quality_of_domains_and_images():
+    assert _domain_quality("https://www.nature.com/articles/x") == 1.0
+    assert _domain_quality("https://news.harvard.edu/x") == 0.8
+    assert _domain_quality("https://notnature.com/x") == 0.0
+    assert _domain_quality("https://[2001:db8::1/a") == 0.0
+    assert _domain_quality(None) == 0.0
+    ranker = Ranker({"sleep": 1.0})
+    with_image, without = _candidate("Sleep"), _candidate("Sleep", image=False)
+    assert ranker.best([without, with_image], now=NOW) is with_image
+
+def test_undated_candidates_have_no_recency():
+    ranker = Ranker({"sleep": 1.0})
+    undated = dict(_candidate("Sleep"), published_at=None)
+    features = ranker.features([undated, _candidate("Sleep")], now=NOW)
+    assert features[0, 1] == 0.0 and np.isclose(features[1, 1], 0.5 ** (1 / HALF_LIFE_HOURS))
@@ -0,0 +1,82 @@
+import time
+from email.utils import formatdate
+import pytest
+import requests
+import ratelimit
+from ratelimit import CircuitBreaker, CircuitOpen, call, rate_limit_wait
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+def _http_error(status, headers=None):
+    return requests.HTTPError(f"{status} Error", response=FakeResponse(status, headers))
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ratelimit.time, "sleep", sleeps.append)
+    monkeypatch.setattr(ratelimit, "_upstreams", {})
+    return sleeps
+
+def test_retry_after_and_rate_limit_headers():
+    assert rate_limit_wait({"Retry-After": "30"}) == 30
+    assert 55 < rate_limit_wait({"retry-after": formatdate(time.time() + 60, usegmt=True)}) <= 60
+    assert rate_limit_wait({"Retry-After": "soon"}) is None
+    # Reddit: seconds until the window resets; Twitter: epoch of the reset
+    assert rate_limit_wait({"X-Ratelimit-Remaining": "0.0", "X-Ratelimit-Reset": "42"}) == 42
+    assert 85 < rate_limit_wait({"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(int(time.time()) + 90)}) <= 90
+    assert rate_limit_wait({"X-Ratelimit-Remaining": "12", "X-Ratelimit-Reset": "42"}) is None
+    assert rate_limit_wait({}) is None and rate_limit_wait(None) is None
+
+def test_circuit_breaker_half_open(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: clock[0])
+    breaker = CircuitBreaker(threshold=2, reset_after=60)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+    clock[0] += 61
+    assert breaker.allow()  # one trial call...
+    assert not breaker.allow()  # ...and only one
+    breaker.failure()  # the trial failed: open for another period
+    clock[0] += 30
+    assert not breaker.allow()
+    clock[0] += 31
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.allow() and breaker.allow()
+
+def test_transient_failures_are_retried(no_waiting):
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise _http_error(503)
+        return "ok"
+    assert call("test-flaky", flaky, retries=3, base_delay=1) == "ok"
+    assert len(attempts) == 3 and len(no_waiting) == 2
+
+def test_non_idempotent_calls_retry_only_refusals():
+    attempts = []
+    def publish(status):
+        attempts.append(status)
+        raise _http_error(status, {"Retry-After": "0"})
+    with pytest.raises(requests.HTTPError):
+        call("test-publish", publish, 503, idempotent=False)
+    assert attempts == [503]
+    with pytest.raises(requests.HTTPError):
+        call("test-publish", publish, 429, retries=2, idempotent=False)
+    assert attempts == [503, 429, 429]
+
+def test_circuit_opens_after_repeated_failures():
+    upstream = ratelimit.get_upstream("test-down", ratelimit.account_of("test-down"))
+    upstream.breaker = CircuitBreaker(threshold=2, reset_after=300)
+    def down():
+        raise requests.ConnectionError("refused")
+    with pytest.raises(requests.ConnectionError):
+        call("test-down", down, retries=2)
+    with pytest.raises(CircuitOpen):
+        call("test-down", down)
@@ -0,0 +1,93 @@
+import time
+import pytest
+import ratelimit
+import sources
+from source_state import SourceState
+
+SOURCE = "reddit:longevity"
+
+def _post(name, age_hours, score=1):
+    return {"name": name, "title": f"Post {name}", "url": f"https://reddit.test/{name}", "score": score,
+            "subreddit": "longevity", "created_utc": time.time() - age_hours * 3600}
+
+class FakeReddit:
+    """/new as a newest-first list with Reddit's before/after paging, and /api/info."""
+    def __init__(self, posts):
+        self.posts = posts
+        self.info = {}
+        self.calls = []
+
+    def request(self, method, path, params):
+        self.calls.append((path, dict(params)))
+        if path == "/api/info":
+            found = [self.info[id_] for id_ in params["id"].split(",") if id_ in self.info]
+            return {"data": {"children": [{"kind": "t3", "data": p} for p in found]}}
+        names = [p["name"] for p in self.posts]
+        limit = params["limit"]
+        if "after" in params:
+            start = names.index(params["after"]) + 1
+        elif "before" in params:
+            if params["before"] not in names:
+                return {"data": {"children": [], "before": None, "after": None}}
+            start = max(0, names.index(params["before"]) - limit)
+            limit = min(limit, names.index(params["before"]))
+        else:
+            start = 0
+        page = self.posts[start:start + limit]
+        return {"data": {"children": [{"kind": "t3", "data": p} for p in page],
+                         "before": page[0]["name"] if page and start > 0 else None,
+                         "after": page[-1]["name"] if page and start + len(page) < len(self.posts) else None}}
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    monkeypatch.setattr(sources, "REDDIT_PAGE", 3)
+    monkeypatch.setattr(sources, "REDDIT_WINDOW_HOURS", 24)
+    monkeypatch.setattr(ratelimit, "_upstreams", {})
+    monkeypatch.setenv("RATE_LIMIT_REDDIT", "6000")  # no throttling between the fake's pages
+    return SourceState(str(tmp_path / "sources.db"))
+
+def _ingest(reddit, state):
+    return sources._ingest_new_posts(reddit, SOURCE, "longevity", state)
+
+def test_first_run_backfills_to_the_window(state):
+    reddit = FakeReddit([_post(f"p{i}", i) for i in range(8)] + [_post("old", 30), _post("older", 40)])
+    assert _ingest(reddit, state) == 8
+    assert [params.get("after") for _, params in reddit.calls] == [None, "p2", "p5"]
+    assert set(state.entries(SOURCE)) == {f"p{i}" for i in range(8)}
+    assert state.cursor(SOURCE) == {"before": "p0"}
+
+def test_first_run_stops_at_known_posts(state):
+    state.add(SOURCE, {"p4": {"title": "Post p4"}})
+    reddit = FakeReddit([_post(f"p{i}", i) for i in range(9)])
+    assert _ingest(reddit, state) == 5
+    assert len(reddit.calls) == 2
+
+def test_cursor_reads_only_newer_posts(state):
+    reddit = FakeReddit([_post(f"p{i}", i + 1) for i in range(4)])
+    _ingest(reddit, state)
+    reddit.posts = [_post(f"n{i}", i / 10) for i in range(4)] + reddit.posts
+    reddit.calls.clear()
+    assert _ingest(reddit, state) == 4
+    assert [params.get("before") for _, params in reddit.calls] == ["p0", "n1"]
+    assert state.cursor(SOURCE) == {"before": "n0"}
+
+def test_removed_cursor_post_falls_back_to_newest_page(state):
+    reddit = FakeReddit([_post(f"p{i}", i + 1) for i in range(2)])
+    _ingest(reddit, state)
+    reddit.posts = [_post("n0", 0.1)] + reddit.posts[1:]  # p0 was deleted
+    reddit.calls.clear()
+    assert _ingest(reddit, state) == 1
+    assert [params for _, params in reddit.calls] == [{"limit": 3, "before": "p0"}, {"limit": 3}]
+    assert state.cursor(SOURCE) == {"before": "n0"}
+
+def test_refresh_updates_scores_and_drops_removed_posts(state, monkeypatch):
+    monkeypatch.setattr(sources, "REDDIT_REFRESH_EVERY", -60)
+    posts = {p["name"]: p for p in (_post("a", 1), _post("b", 2), _post("c", 3))}
+    state.add(SOURCE, {name: sources._reddit_post(p) for name, p in posts.items()},
+              {name: p["created_utc"] for name, p in posts.items()})
+    reddit = FakeReddit([])
+    reddit.info = {"a": {**posts["a"], "score": 50}, "b": {**posts["b"], "removed_by_category": "moderator"}}
+    assert sources._refresh_scores(reddit, SOURCE, state) == 1
+    (path, params), = reddit.calls
+    assert path == "/api/info" and sorted(params["id"].split(",")) == ["a", "b", "c"]
+    assert {name: p["score"] for name, p in state.entries(SOURCE).items()} == {"a": 50}
@@ -0,0 +1,19 @@
+import sources
+from plugins import Plugin
+
+def _ok():
+    return [{"type": "news", "title": "A study", "url": "https://example.org/study"}]
+
+def _broken():
+    raise RuntimeError("503 Error for url: https://newsapi.test/v2/everything?apiKey=secret")
+
+def test_one_failing_source_keeps_the_others(monkeypatch, caplog):
+    monkeypatch.setattr(sources, "SOURCES", [
+        Plugin("ok", "OK", "tests.test_sources:_ok"),
+        Plugin("broken", "Broken", "tests.test_sources:_broken"),
+        Plugin("missing", "Missing", "tests.no_such_module:fetch"),
+    ])
+    monkeypatch.delenv("CONTENT_SOURCES", raising=False)
+    assert sources.fetch_candidates() == _ok()
+    assert "Broken failed" in caplog.text and "Missing failed" in caplog.text
+    assert "secret" not in caplog.text